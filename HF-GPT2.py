@@ -1,20 +1,13 @@
-import torch
-import gradio as gr
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from startup import import_timings, timed_import
 
-MODEL_NAME = "Rave271/f1-gpt2-finetuned"
-
-# Load model + tokenizer
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
+with timed_import("gradio"):
+    import gradio as gr
+from gpt2_server import GPT2InferenceServer
 
-# GPT-2 pad fix
-tokenizer.pad_token = tokenizer.eos_token
-model.config.pad_token_id = tokenizer.eos_token_id
+MODEL_NAME = "Rave271/f1-gpt2-finetuned"
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model.to(device)
-model.eval()
+# Micro-batched, int8-quantized CPU inference; concurrent requests share generate calls
+server = GPT2InferenceServer(MODEL_NAME, max_batch_size=8)
 
 # 🔥 Reduced copy-bias prompt (no repeated ranking blocks)
 DEFAULT_PROMPT = """F1 2024 Constructor Championship Prediction
@@ -33,42 +26,7 @@ Final Result:
 """
 
 def generate(prompt):
-    model.eval()
-
-    # Anchor structure
-    prompt = prompt.rstrip()
-    if not prompt.endswith("1."):
-        prompt = prompt + "\n1."
-
-    inputs = tokenizer(prompt, return_tensors="pt").to(device)
-
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=120,
-            temperature=0.25,              # Lower = more stable
-            top_k=20,
-            top_p=0.9,
-            repetition_penalty=1.2,
-            no_repeat_ngram_size=3,        # Prevent copying
-            do_sample=True,
-            pad_token_id=tokenizer.eos_token_id,
-        )
-
-    full_text = tokenizer.decode(outputs[0], skip_special_tokens=True)
-
-    # Extract only ranking lines
-    lines = full_text.split("\n")
-    result_lines = []
-
-    for line in lines:
-        line = line.strip()
-        if line.startswith(tuple(str(i) + "." for i in range(1, 11))):
-            result_lines.append(line)
-        if len(result_lines) == 10:
-            break
-
-    return "\n".join(result_lines)
+    return server.generate(prompt)
 
 
 interface = gr.Interface(
@@ -76,6 +34,11 @@ interface = gr.Interface(
     inputs=gr.Textbox(value=DEFAULT_PROMPT, lines=20, label="Input Prompt"),
     outputs="text",
     title="F1 GPT-2 Championship Predictor",
+    # Let requests overlap so the server can batch them
+    concurrency_limit=server.max_batch_size,
 )
 
+# Serve the UI straight away; the model loads in the background and requests wait for it
+server.start_background()
+print("Import timings:", ", ".join(f"{name} {seconds:.2f}s" for name, seconds in import_timings().items()))
 interface.launch()
\ No newline at end of file
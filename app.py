@@ -1,6 +1,25 @@
-import streamlit as st
-from data_cleaning import get_seasonal_data, format_historical_data, get_available_years
-from predict import get_prediction, get_rag_prediction
+import itertools
+import os
+
+from startup import preload, preload_from_env, readiness, timed_import
+from tracing import breakdown, get_trace, span, start_metrics_server
+
+# Only light modules are imported up front; the ML stacks load lazily or in background preloads
+with timed_import("streamlit"):
+    import streamlit as st
+with timed_import("data_cleaning"):
+    from data_cleaning import (clear_cache, format_historical_data, get_available_years, get_data_version,
+                               get_round_data, get_seasonal_data, on_data_refresh)
+with timed_import("predict"):
+    from predict import get_baseline_prediction
+    from scheduler import scheduler_stats, stream_prediction
+
+# Start the preloads named in F1_PRELOAD (e.g. "vector_store,ollama") once per process
+preload_from_env()
+
+# Serve per-stage timings at /metrics (OpenMetrics) and /spans (JSON) when a port is configured
+if os.environ.get("F1_METRICS_PORT"):
+    start_metrics_server()
 
 # Page config
 st.set_page_config(
@@ -9,6 +28,48 @@ st.set_page_config(
     layout="wide"
 )
 
+# Cross-session caches. Data results are keyed on the data version, so a change to
+# the CSVs or a dataset version switch is picked up on the next rerun; the refresh
+# hook also drops stale entries when the extent of a change is unknown.
+@st.cache_resource(show_spinner=False)
+def register_refresh_hook():
+    on_data_refresh(lambda data_dir, changes: st.cache_data.clear() if changes is None else None)
+    return True
+
+@st.cache_resource(show_spinner=False)
+def vector_store_resources():
+    """Open the vector store and load the embedding model once for all sessions, in the background."""
+    return preload("vector_store")
+
+@st.cache_data(show_spinner=False)
+def load_available_years(data_version):
+    return get_available_years()
+
+@st.cache_data(show_spinner=False)
+def load_last_round(year, data_version):
+    rounds = get_round_data()
+    return int(rounds.loc[rounds['year'] == year, 'round'].max())
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_historical_data(start_year, end_year, data_version):
+    seasonal = get_seasonal_data(start_year, end_year)
+    raw = seasonal[['year', 'name', 'points', 'position', 'wins']]
+    return raw, format_historical_data(seasonal, start_year, end_year)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_baseline_prediction(start_year, end_year, target_year, data_version):
+    return get_baseline_prediction(start_year, end_year, target_year)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_simulation(year, after_round, data_version):
+    with timed_import("simulator"):
+        from simulator import format_simulation, simulate_season
+    result = simulate_season(year, after_round)
+    return format_simulation(result), result
+
+register_refresh_hook()
+data_version = get_data_version()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -56,23 +117,51 @@ st.sidebar.header("⚙️ Settings")
 
 # Prediction mode
 st.sidebar.subheader("🧠 Prediction Mode")
-use_rag = st.sidebar.toggle("Use RAG (Vector Database)", value=True, 
-                            help="RAG retrieves relevant historical data from vector database for better context")
+prediction_mode = st.sidebar.radio(
+    "Mode", ["RAG (Vector Database)", "Legacy", "Statistical Baseline", "Season Simulation"],
+    help="RAG retrieves relevant historical data from vector database for better context. "
+         "Statistical Baseline is an instant recency-weighted trend model, no LLM. "
+         "Season Simulation runs a Monte Carlo of the rest of a season from the standings after a round."
+)
+use_rag = prediction_mode.startswith("RAG")
+use_baseline = prediction_mode == "Statistical Baseline"
+use_simulation = prediction_mode == "Season Simulation"
 
 if use_rag:
     st.sidebar.success("✅ RAG Mode Active")
     st.sidebar.caption("Using ChromaDB + Sentence Transformers")
+    # Open the vector store and load the embedding model once per process, off the request path
+    from vector_store import health
+    vector_store_resources()
+    vector_health = health()
+    if vector_health["error"]:
+        st.sidebar.warning(f"Vector store not ready: {vector_health['error']}")
+    elif not vector_health["ready"]:
+        st.sidebar.caption("⏳ Loading vector store and embedding model...")
+elif use_baseline:
+    st.sidebar.info("📈 Statistical Baseline")
+    st.sidebar.caption("Recency-weighted points-share trend, computed instantly")
+elif use_simulation:
+    st.sidebar.info("🎲 Season Simulation")
+    st.sidebar.caption("Monte Carlo of the remaining races, no LLM")
 else:
     st.sidebar.info("📝 Legacy Mode")
     st.sidebar.caption("Using formatted text context")
 
 # Get available years
-available_years = get_available_years()
+available_years = load_available_years(data_version)
 min_year = min(available_years)
 max_year = max(available_years)
 
 # Year range selector (only for legacy mode)
-if not use_rag:
+if use_simulation:
+    st.sidebar.subheader("Season to Simulate")
+    simulation_year = st.sidebar.selectbox("Season", available_years[::-1])
+    start_year = end_year = simulation_year
+    simulation_last_round = load_last_round(simulation_year, data_version)
+    simulation_round = st.sidebar.slider("Standings After Round", 1, simulation_last_round,
+                                         max(1, simulation_last_round // 2))
+elif not use_rag:
     st.sidebar.subheader("Historical Data Range")
     start_year = st.sidebar.slider("Start Year", min_year, max_year, max(min_year, max_year - 4))
     end_year = st.sidebar.slider("End Year", start_year, max_year, max_year)
@@ -81,13 +170,22 @@ else:
     end_year = max_year
 
 # Target year
-st.sidebar.subheader("Prediction Target")
-target_year = st.sidebar.number_input("Predict Season", min_value=end_year + 1, max_value=2030, value=end_year + 1)
+if use_simulation:
+    target_year = simulation_year
+else:
+    st.sidebar.subheader("Prediction Target")
+    target_year = st.sidebar.number_input("Predict Season", min_value=end_year + 1, max_value=2030, value=end_year + 1)
 
 # Temperature
-st.sidebar.subheader("Model Settings")
-temperature = st.sidebar.slider("Temperature", 0.1, 1.0, 0.8, 0.1, 
-                                help="Higher = more creative, Lower = more deterministic")
+if not (use_baseline or use_simulation):
+    st.sidebar.subheader("Model Settings")
+    temperature = st.sidebar.slider("Temperature", 0.1, 1.0, 0.8, 0.1, 
+                                    help="Higher = more creative, Lower = more deterministic")
+    deterministic = st.sidebar.checkbox("Deterministic (fixed seed)", value=False,
+                                        help="Fix the sampling seed so identical requests give identical, cacheable answers")
+else:
+    temperature = 0.8
+    deterministic = False
 
 # RAG query (optional)
 if use_rag:
@@ -98,6 +196,56 @@ if use_rag:
 else:
     custom_query = ""
 
+# Data refresh: reload the CSVs and drop every cached result derived from them
+if st.sidebar.button("🔄 Reload Data", help="Re-read the CSVs and clear cached data for all sessions"):
+    clear_cache()
+    st.rerun()
+
+# Dataset versions: switching is process-wide, so it applies to every session
+with st.sidebar.expander("🗂️ Dataset Version", expanded=False):
+    from dataset_registry import activate, list_versions
+
+    versions = list_versions()
+    st.caption(f"Active: {data_version}")
+    if versions:
+        labels = {
+            version["id"]: f"{version['id']} ({', '.join(version['names'] or version['dirs'])})"
+            for version in versions
+        }
+        chosen = st.selectbox("Version", list(labels), format_func=labels.get,
+                              index=list(labels).index(data_version) if data_version in labels else 0)
+        if st.button("Activate", disabled=chosen == data_version):
+            report = activate(chosen, sync_index=use_rag)
+            st.session_state.version_report = report
+            st.rerun()
+    else:
+        st.caption("No versions registered: `python3 dataset_registry.py register data`")
+    if "version_report" in st.session_state:
+        report = st.session_state.version_report
+        st.caption(f"Switched {report['from']} → {report['to']} in {report['seconds']:.2f}s: "
+                   f"{len(report['years'])} seasons changed, {report['predictions_dropped']} cached predictions dropped")
+
+show_timings = st.sidebar.checkbox("Show timing breakdown", value=False,
+                                   help="Per-stage timings of the last prediction: data, retrieval, prompt and LLM")
+
+# Startup timings
+with st.sidebar.expander("⏱️ Startup & Readiness", expanded=False):
+    startup_status = readiness()
+    for name, seconds in startup_status["imports"].items():
+        st.caption(f"import {name}: {seconds * 1000:.0f} ms")
+    for name, status in startup_status["preloads"].items():
+        timing = f" in {status['seconds']:.2f}s" if status["seconds"] is not None else ""
+        st.caption(f"preload {name}: {status['state']}{timing}" + (f" ({status['error']})" if status["error"] else ""))
+    st.caption(f"Heavy ML modules loaded: {', '.join(startup_status['heavy_modules']) or 'none'}")
+
+# Shared prediction queue (process-wide, so it covers every session)
+with st.sidebar.expander("🚦 Prediction Queue", expanded=False):
+    queue = scheduler_stats()
+    st.caption(f"{queue['running']}/{queue['concurrency']} running • {queue['queue_depth']} queued")
+    st.caption(f"Wait p50 {queue['wait_p50']:.2f}s • max {queue['wait_max']:.2f}s")
+    st.caption(f"{queue['completed']} completed • {queue['coalesced'] + queue['streams_coalesced']} shared "
+               f"• {queue['cancelled'] + queue['streams_abandoned']} cancelled")
+
 # Main content
 col1, col2 = st.columns([1, 1])
 
@@ -110,11 +258,10 @@ with col1:
     
     # Show historical data
     try:
-        seasonal = get_seasonal_data(start_year, end_year)
-        historical_text = format_historical_data(seasonal, start_year, end_year)
+        raw_data, historical_text = load_historical_data(start_year, end_year, data_version)
         
         with st.expander("View Raw Data", expanded=False):
-            st.dataframe(seasonal[['year', 'name', 'points', 'position', 'wins']], width='stretch')
+            st.dataframe(raw_data, width='stretch')
         
         if use_rag:
             if 'rag_context' in st.session_state:
@@ -131,25 +278,92 @@ with col2:
     
     if use_rag:
         st.caption("🧠 Using RAG with vector embeddings")
+    elif use_baseline:
+        st.caption("📈 Using the statistical baseline")
+    elif use_simulation:
+        st.caption(f"🎲 Simulating the rest of {simulation_year} from round {simulation_round}")
     
     # Predict button
     if st.button("🚀 Generate Prediction", type="primary", use_container_width=True):
-        with st.spinner("Generating prediction with Llama 3 8B..."):
-            try:
-                if use_rag:
-                    prediction, context = get_rag_prediction(custom_query, target_year, temperature)
+        try:
+            with span("prediction", mode=prediction_mode) as prediction_span:
+                st.session_state['trace_id'] = prediction_span.trace_id
+                if use_simulation:
+                    prediction, result = load_simulation(simulation_year, simulation_round, data_version)
                     st.session_state['prediction'] = prediction
-                    st.session_state['rag_context'] = context
-                else:
-                    prediction, _ = get_prediction(start_year, end_year, target_year, temperature)
+                    st.session_state['prediction_stats'] = {}
+                    st.session_state['prediction_table'] = result
+                    st.rerun()
+                if use_baseline:
+                    prediction, standings = load_baseline_prediction(start_year, end_year, target_year, data_version)
                     st.session_state['prediction'] = prediction
+                    st.session_state['prediction_stats'] = {}
+                    st.session_state['prediction_table'] = standings
+                    st.rerun()
+                # Predictions go through the shared scheduler: identical requests from any session
+                # share one generation, and at most F1_LLM_CONCURRENCY run at once
+                if use_rag:
+                    stream = stream_prediction("rag", query=custom_query, target_year=target_year,
+                                               temperature=temperature, deterministic=deterministic)
+                else:
+                    stream = stream_prediction("legacy", start_year=start_year, end_year=end_year,
+                                               target_year=target_year, temperature=temperature,
+                                               deterministic=deterministic)
+                # Render tokens as Ollama produces them instead of waiting for the full answer. If the
+                # session goes away mid-stream, close() withdraws the request so its generation stops
+                try:
+                    tokens = iter(stream)
+                    # The spinner covers the queue and the wait for the first token only
+                    with st.spinner("Waiting for a free model slot..."):
+                        first = next(tokens, None)
+                    if first is not None:
+                        st.write_stream(itertools.chain([first], tokens))
+                finally:
+                    stream.close()
+                st.session_state['queue_wait'] = stream.wait_seconds
+                st.session_state['prediction'] = stream.text
+                st.session_state['prediction_stats'] = stream.stats
+                standings = stream.standings
+                if standings.entries:
+                    st.session_state['prediction_table'] = standings.to_frame()
+                else:
+                    st.session_state.pop('prediction_table', None)
+                if use_rag:
+                    st.session_state['rag_context'] = stream.context
                 st.rerun()
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
     
     # Display prediction
     if 'prediction' in st.session_state:
         st.text_area("Prediction Results", st.session_state['prediction'], height=400, disabled=True)
+        if 'prediction_table' in st.session_state:
+            with st.expander("Predicted Standings Table", expanded=False):
+                st.dataframe(st.session_state['prediction_table'], width='stretch')
+        stats = st.session_state.get('prediction_stats', {})
+        if st.session_state.get('queue_wait', 0) >= 0.5:
+            st.caption(f"⏳ Waited {st.session_state['queue_wait']:.1f}s in the prediction queue")
+        if stats.get('cached'):
+            st.caption("⚡ Served from the prediction cache")
+        elif stats.get('eval_count') and stats.get('eval_duration'):
+            tokens_per_second = stats['eval_count'] / (stats['eval_duration'] / 1e9)
+            st.caption(
+                f"{stats['eval_count']} tokens • {tokens_per_second:.1f} tokens/s • "
+                f"first token after {stats.get('time_to_first_token', 0):.2f}s • "
+                f"model load {stats.get('load_duration', 0) / 1e9:.2f}s"
+            )
+        elif stats.get('stopped_early'):
+            st.caption(
+                f"{stats.get('token_count', 0)} tokens • stopped once the ranking was complete • "
+                f"first token after {stats.get('time_to_first_token', 0):.2f}s"
+            )
+        if show_timings and 'trace_id' in st.session_state:
+            timing_rows = breakdown(get_trace(st.session_state['trace_id']))
+            if timing_rows:
+                with st.expander("⏱️ Timing Breakdown", expanded=True):
+                    st.dataframe(timing_rows, width='stretch', column_config={
+                        "share": st.column_config.ProgressColumn("share", min_value=0.0, max_value=1.0),
+                    })
     else:
         st.info("Click 'Generate Prediction' to get the AI prediction")
 
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from data_cleaning import format_historical_data, get_cleaned_data, get_constructors, get_seasonal_data
+from standings_parser import TeamMatcher, parse_standings
+
+PREDICTORS = ("baseline", "legacy", "rag", "gpt2", "gpt2-midseason")
+
+# Predictors that also see part of the held-out season; not comparable with the season-ahead ones
+MIDSEASON_PREDICTORS = ("gpt2-midseason",)
+
+# Tokens generated per LLM predictor, matching the interactive prediction functions
+NUM_PREDICT = {"legacy": 300, "rag": 400}
+
+def stub_generate(target_year):
+    """Offline stand-in for the LLMs: answers with the previous season's final standings.
+
+    The answer is rendered like a model's ranking so the parse and scoring steps
+    run exactly as they do for real output. It only depends on the data, so
+    results are reproducible.
+    """
+    previous = get_seasonal_data(target_year - 1, target_year - 1)
+    lines = [
+        f"{position}. {name} - {points:g} points"
+        for position, (name, points) in enumerate(zip(previous['name'], previous['points']), 1)
+    ]
+    return "\n".join(lines) + f"\n\n{previous['name'].iloc[0]} keeps its form. Stub prediction."
+
+_gpt2_server = None
+
+# Torch threads per process; run_backtest splits the cores between its worker processes
+_gpt2_threads = None
+
+def _init_worker(threads):
+    global _gpt2_threads
+    _gpt2_threads = threads
+
+def _gpt2_generate(prompt):
+    # One model per worker process, loaded on its first GPT-2 season
+    global _gpt2_server
+    if _gpt2_server is None:
+        from gpt2_server import GPT2InferenceServer
+
+        _gpt2_server = GPT2InferenceServer(max_batch_size=1, num_threads=_gpt2_threads)
+    return _gpt2_server.generate(prompt)
+
+def build_prompt(predictor, target_year, window):
+    """Assemble the predictor's prompt.
+
+    Every predictor but gpt2-midseason reads seasons before target_year only.
+    gpt2-midseason is the fine-tuned model's mid-season task: it also gets the
+    target season's standings after half its rounds, so it answers an easier
+    question and is reported apart.
+    """
+    from predict import build_rag_prompt, build_season_prompt
+
+    if predictor == "legacy":
+        start_year, end_year = target_year - window, target_year - 1
+        historical_data = format_historical_data(get_seasonal_data(start_year, end_year), start_year, end_year)
+        return build_season_prompt(historical_data, target_year)
+    if predictor == "rag":
+        # The context table covers target_year - window .. target_year - 1
+        from context_builder import build_context
+
+        return build_rag_prompt(build_context(target_year, window), target_year)
+    if predictor == "gpt2":
+        # The season examples of the fine-tuning dataset, prompt only
+        from finetune_dataset import season_prompt
+
+        return season_prompt(get_cleaned_data(), target_year, window)
+    if predictor == "gpt2-midseason":
+        from data_cleaning import get_season_lengths
+        from round_index import build_midseason_prompt
+
+        # Standings after half of the held-out season (see MIDSEASON_PREDICTORS)
+        after_round = max(1, int(get_season_lengths().get(target_year, 2)) // 2)
+        return build_midseason_prompt(target_year, after_round)
+    raise ValueError(f"Unknown predictor: {predictor}")
+
+def predict_text(predictor, target_year, window, stub=False, model="llama3:8b", temperature=0.8):
+    """Run an LLM predictor for target_year and return its raw answer."""
+    prompt = build_prompt(predictor, target_year, window)
+    if stub:
+        return stub_generate(target_year)
+    if predictor.startswith("gpt2"):
+        return _gpt2_generate(prompt)
+    from predict import run_prompt
+
+    return run_prompt(prompt, model, temperature, NUM_PREDICT[predictor], deterministic=True)
+
+def _rank(values):
+    """Ranks starting at 1, averaging ties."""
+    values = np.asarray(values, dtype=float)
+    order = values.argsort(kind='stable')
+    ranks = np.empty(len(values))
+    ranks[order] = np.arange(1, len(values) + 1)
+    for value in np.unique(values):
+        tied = values == value
+        ranks[tied] = ranks[tied].mean()
+    return ranks
+
+def spearman(a, b):
+    """Spearman rank correlation of two equal-length sequences (nan if undefined)."""
+    if len(a) < 2:
+        return float('nan')
+    ra, rb = _rank(a), _rank(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return float('nan')
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def score(predicted, actual):
+    """Score predicted standings (position, constructorId, points) against the real final rows."""
+    actual_by_id = {cid: (pos, pts) for cid, pos, pts in zip(actual['constructorId'], actual['position'], actual['points'])}
+    matched = [(pos, cid, pts) for pos, cid, pts in predicted if cid in actual_by_id]
+    predicted_positions = [pos for pos, _, _ in matched]
+    actual_positions = [actual_by_id[cid][0] for _, cid, _ in matched]
+    errors = [abs(pts - actual_by_id[cid][1]) for _, cid, pts in matched if pts is not None]
+    champion = actual.loc[actual['position'] == 1, 'constructorId']
+    return {
+        "spearman": spearman(predicted_positions, actual_positions),
+        "points_mae": float(np.mean(errors)) if errors else float('nan'),
+        "champion_hit": bool(predicted and not champion.empty and predicted[0][1] == champion.iloc[0]),
+        "coverage": len(matched) / len(actual) if len(actual) else 0.0,
+    }
+
+def backtest_season(predictor, target_year, window=4, stub=False, model="llama3:8b", temperature=0.8):
+    """Predict one held-out season from the seasons before it and score the result."""
+    start = time.perf_counter()
+    record = {"predictor": predictor, "year": target_year, "window": window, "stub": stub,
+              "midseason": predictor in MIDSEASON_PREDICTORS}
+    try:
+        seasonal = get_cleaned_data()
+        actual = seasonal[seasonal['year'] == target_year]
+        if predictor == "baseline":
+            from baseline import predict_standings
+
+            standings = predict_standings(seasonal, target_year, n_recent_years=window)
+            predicted = list(zip(standings['position'], standings['constructorId'], standings['predicted_points']))
+            record["parse_complete"] = True
+        else:
+            text = predict_text(predictor, target_year, window, stub, model, temperature)
+            # Resolve names among teams seen in the input seasons, never the held-out one
+            history = seasonal[(seasonal['year'] >= target_year - window) & (seasonal['year'] < target_year)]
+            constructors = get_constructors()
+            matcher = TeamMatcher(constructors[constructors['constructorId'].isin(history['constructorId'])])
+            parsed = parse_standings(text, matcher)
+            predicted = [(entry.position, entry.constructorId, entry.points) for entry in parsed.entries]
+            record["parse_complete"] = parsed.complete
+            record["unknown_teams"] = len(parsed.unknown_teams)
+        record.update(score(predicted, actual))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+def _run_task(task):
+    return backtest_season(**task)
+
+def summarize(records):
+    """Average each metric per predictor over the seasons that ran."""
+    summary = {}
+    for predictor in sorted({r["predictor"] for r in records}):
+        ok = [r for r in records if r["predictor"] == predictor and "error" not in r]
+        failed = sum(1 for r in records if r["predictor"] == predictor and "error" in r)
+        summary[predictor] = {
+            "midseason": predictor in MIDSEASON_PREDICTORS,
+            "seasons": len(ok),
+            "failed": failed,
+            "spearman": float(np.nanmean([r["spearman"] for r in ok])) if ok else float('nan'),
+            "points_mae": float(np.nanmean([r["points_mae"] for r in ok])) if ok else float('nan'),
+            "champion_hit_rate": float(np.mean([r["champion_hit"] for r in ok])) if ok else float('nan'),
+            "parse_complete_rate": float(np.mean([r["parse_complete"] for r in ok])) if ok else float('nan'),
+            "seconds": float(sum(r["seconds"] for r in ok)),
+        }
+    return summary
+
+def run_backtest(predictors, years, window=4, stub=False, workers=None, model="llama3:8b", temperature=0.8):
+    """Backtest every (predictor, year) across a process pool; returns (records, summary)."""
+    tasks = [
+        {"predictor": predictor, "target_year": year, "window": window, "stub": stub,
+         "model": model, "temperature": temperature}
+        for predictor in predictors for year in years
+    ]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        records = [_run_task(task) for task in tasks]
+    else:
+        # Each process gets its share of the cores, so GPT-2 workers do not oversubscribe the CPU
+        threads = max(1, os.cpu_count() // workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            records = list(pool.map(_run_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    return records, summarize(records)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest predictors on held-out seasons against the real standings.")
+    parser.add_argument("--predictors", nargs="+", choices=PREDICTORS, default=["baseline", "legacy", "rag"])
+    parser.add_argument("--start", type=int, default=2000, help="First held-out season")
+    parser.add_argument("--end", type=int, help="Last held-out season (default: latest in the data)")
+    parser.add_argument("--window", type=int, default=4, help="Seasons of history before each target")
+    parser.add_argument("--stub", action="store_true", help="Replace LLM calls with an offline, deterministic stub")
+    parser.add_argument("--workers", type=int, help="Processes (default: CPU count)")
+    parser.add_argument("--model", default="llama3:8b")
+    parser.add_argument("--temperature", type=float, default=0.8)
+    parser.add_argument("--output", help="Write per-season records and the summary as JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    end = args.end or int(get_cleaned_data()['year'].max())
+    first = max(args.start, int(get_cleaned_data()['year'].min()) + args.window)
+    years = list(range(first, end + 1))
+    if not years:
+        # Same form and exit status as argparse's own usage errors
+        print(f"backtest.py: error: no seasons to backtest: the range {first}-{end} is empty "
+              f"(--start {args.start}, --end {end}, --window {args.window})", file=sys.stderr)
+        sys.exit(2)
+    start = time.perf_counter()
+    records, summary = run_backtest(args.predictors, years, args.window, args.stub, args.workers,
+                                    args.model, args.temperature)
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(years)} seasons ({years[0]}-{years[-1]}), window {args.window}, {elapsed:.1f}s"
+          + (" [stub LLM]" if args.stub else ""))
+    print(f"{'predictor':<16} {'spearman':>9} {'points MAE':>11} {'champion':>9} {'parsed':>7} {'failed':>7}")
+    for predictor, row in summary.items():
+        label = predictor + ("*" if row["midseason"] else "")
+        print(f"{label:<16} {row['spearman']:>9.3f} {row['points_mae']:>11.1f} "
+              f"{row['champion_hit_rate']:>9.1%} {row['parse_complete_rate']:>7.1%} {row['failed']:>7}")
+    if any(row["midseason"] for row in summary.values()):
+        print("* mid-season predictor: also sees the held-out season's standings after half its rounds")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"records": records, "summary": summary}, f, indent=2)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from data_cleaning import get_cleaned_data
+
+# Each season back counts this much less than the one after it
+RECENCY_DECAY = 0.5
+
+# Fraction of the fitted points-share trend carried into the predicted season
+TREND_DAMPING = 0.5
+
+def predict_standings(seasonal, target_year, n_recent_years=4, decay=RECENCY_DECAY, damping=TREND_DAMPING):
+    """Predict final standings for target_year with a weighted recency regression.
+
+    Each constructor's share of the season's points is fitted against the year
+    with exponentially decaying weights over the last n_recent_years seasons.
+    The damped trend is extrapolated to target_year. Shares are converted to
+    points using the most recent season's total. Only constructors present in
+    the most recent season are ranked.
+
+    Returns a DataFrame with position, name, constructorId, predicted_points
+    and share, best first.
+    """
+    history = seasonal[(seasonal['year'] >= target_year - n_recent_years) & (seasonal['year'] < target_year)]
+    if history.empty:
+        raise ValueError(f"No seasons before {target_year} in the data")
+    last_year = history['year'].max()
+    teams = history.loc[history['year'] == last_year, ['constructorId', 'name']]
+
+    # Constructor x year matrix of points share; NaN where a team did not race
+    totals = history.groupby('year')['points'].transform('sum')
+    share = (history['points'] / totals.where(totals > 0)).fillna(0.0)
+    matrix = share.groupby([history['constructorId'], history['year']]).sum().unstack('year')
+    matrix = matrix.reindex(teams['constructorId'])
+    shares = matrix.to_numpy(dtype=float)
+    years = matrix.columns.to_numpy(dtype=float)
+
+    # Weighted least squares of share on year, per constructor, all at once
+    mask = ~np.isnan(shares)
+    weights = np.where(mask, decay ** (last_year - years), 0.0)
+    values = np.where(mask, shares, 0.0)
+    weight_sum = weights.sum(axis=1)
+    mean_year = (weights * years).sum(axis=1) / weight_sum
+    mean_share = (weights * values).sum(axis=1) / weight_sum
+    dx = years - mean_year[:, None]
+    var = (weights * dx ** 2).sum(axis=1)
+    cov = (weights * dx * (values - mean_share[:, None])).sum(axis=1)
+    slope = np.divide(cov, var, out=np.zeros_like(cov), where=var > 0)
+
+    predicted = np.clip(mean_share + damping * slope * (target_year - mean_year), 0.0, None)
+    if predicted.sum() > 0:
+        predicted = predicted / predicted.sum()
+
+    total_points = history.loc[history['year'] == last_year, 'points'].sum()
+    result = pd.DataFrame({
+        'name': teams['name'].to_numpy(),
+        'constructorId': teams['constructorId'].to_numpy(),
+        'predicted_points': np.round(predicted * total_points, 1),
+        'share': predicted,
+    })
+    result = result.sort_values('predicted_points', ascending=False, kind='stable').reset_index(drop=True)
+    result.insert(0, 'position', np.arange(1, len(result) + 1))
+    return result
+
+def format_prediction(standings, target_year):
+    """Render predicted standings as text in the same shape as the LLM answers."""
+    lines = (
+        standings['position'].astype(str) + ". " + standings['name'].astype(str) + " - "
+        + standings['predicted_points'].round().astype(int).astype(str) + " points"
+    )
+    leader, runner_up = standings.iloc[0], standings.iloc[1]
+    summary = (
+        f"{leader['name']} is projected to win the {target_year} championship on recent form, "
+        f"{int(round(leader['predicted_points'] - runner_up['predicted_points']))} points ahead of {runner_up['name']}. "
+        f"Projection is a recency-weighted trend of each team's share of points."
+    )
+    return "\n".join(lines) + "\n\n" + summary
+
+def predict_season(target_year=2024, n_recent_years=4, data_dir=None):
+    """Predict target_year from the cached seasonal data; returns (standings, text)."""
+    standings = predict_standings(get_cleaned_data(data_dir), target_year, n_recent_years)
+    return standings, format_prediction(standings, target_year)
+
+if __name__ == "__main__":
+    standings, text = predict_season(2024)
+    print(text)
@@ -0,0 +1,129 @@
+import argparse
+import itertools
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from data_cleaning import get_seasonal_data, format_historical_data
+from predict import build_rag_prompt, build_season_prompt, get_rag_context
+from scheduler import PRIORITY_BATCH, configure, scheduler_stats, submit_prediction
+
+# Tokens generated per mode, matching the interactive prediction functions
+NUM_PREDICT = {"legacy": 300, "rag": 400}
+
+def build_jobs(modes, years, windows, temperatures, models):
+    """Expand the configuration grid into one job dict per combination."""
+    return [
+        {"mode": mode, "target_year": year, "window": window, "temperature": temperature, "model": model}
+        for mode, year, window, temperature, model in itertools.product(modes, years, windows, temperatures, models)
+    ]
+
+class ContextCache:
+    """Builds each (mode, target_year, window) context once and shares it across jobs."""
+
+    def __init__(self, query=""):
+        self.query = query
+        self._contexts = {}
+        self._lock = threading.Lock()
+
+    def _build(self, mode, target_year, window):
+        if mode == "rag":
+            context = get_rag_context(self.query, target_year, n_recent_years=window)
+            return build_rag_prompt(context, target_year)
+        start_year, end_year = target_year - window, target_year - 1
+        historical_data = format_historical_data(get_seasonal_data(start_year, end_year), start_year, end_year)
+        return build_season_prompt(historical_data, target_year)
+
+    def get(self, mode, target_year, window):
+        """Return (prompt, seconds spent building it, whether it was shared)."""
+        key = (mode, target_year, window)
+        with self._lock:
+            entry = self._contexts.get(key)
+            if entry is None:
+                entry = {"event": threading.Event()}
+                self._contexts[key] = entry
+                owner = True
+            else:
+                owner = False
+        if owner:
+            start = time.perf_counter()
+            try:
+                entry["prompt"] = self._build(mode, target_year, window)
+            except Exception as e:
+                entry["error"] = e
+            entry["seconds"] = time.perf_counter() - start
+            entry["event"].set()
+        else:
+            entry["event"].wait()
+        if "error" in entry:
+            raise entry["error"]
+        return entry["prompt"], entry["seconds"], not owner
+
+def run_job(job, contexts, use_cache=True, deterministic=False):
+    """Run one job and return its result record with timings."""
+    start = time.perf_counter()
+    record = dict(job)
+    try:
+        prompt, context_seconds, shared = contexts.get(job["mode"], job["target_year"], job["window"])
+        record["context_seconds"] = 0.0 if shared else context_seconds
+        record["context_shared"] = shared
+        generate_start = time.perf_counter()
+        # Through the shared scheduler at batch priority, so interactive requests in the same process go first
+        record["prediction"] = submit_prediction(
+            "prompt", priority=PRIORITY_BATCH, prompt=prompt, model=job["model"], temperature=job["temperature"],
+            num_predict=NUM_PREDICT[job["mode"]], use_cache=use_cache, deterministic=deterministic
+        )
+        record["generation_seconds"] = time.perf_counter() - generate_start
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["total_seconds"] = time.perf_counter() - start
+    return record
+
+def run_batch(jobs, workers=2, query="", use_cache=True, deterministic=False, output=sys.stdout):
+    """Run jobs with bounded parallelism, writing each result as a JSON line as it completes.
+
+    Context building runs on `workers` threads; generations are limited by the
+    scheduler's concurrency (see configure).
+    """
+    contexts = ContextCache(query)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job, contexts, use_cache, deterministic) for job in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            failures += "error" in record
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+    return failures
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate F1 constructor predictions for a grid of configurations.")
+    parser.add_argument("--years", type=int, nargs="+", default=[2024], help="Target seasons to predict")
+    parser.add_argument("--windows", type=int, nargs="+", default=[4], help="Seasons of history before each target")
+    parser.add_argument("--temperatures", type=float, nargs="+", default=[0.8])
+    parser.add_argument("--models", nargs="+", default=["llama3:8b"])
+    parser.add_argument("--modes", nargs="+", choices=sorted(NUM_PREDICT), default=["rag"])
+    parser.add_argument("--query", default="", help="Custom RAG query added to every rag job")
+    parser.add_argument("--workers", type=int, default=2, help="Jobs run in parallel (and concurrent generations)")
+    parser.add_argument("--deterministic", action="store_true", help="Fix the sampling seed")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the prediction cache")
+    parser.add_argument("--output", help="JSONL output file (default: stdout)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure(args.workers)
+    jobs = build_jobs(args.modes, args.years, args.windows, args.temperatures, args.models)
+    print(f"Running {len(jobs)} jobs with {args.workers} workers...", file=sys.stderr)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        failures = run_batch(jobs, args.workers, args.query, not args.no_cache, args.deterministic, output)
+    finally:
+        if args.output:
+            output.close()
+    queue = scheduler_stats()
+    print(f"Done: {len(jobs) - failures} succeeded, {failures} failed "
+          f"(queue wait p50 {queue['wait_p50']:.2f}s, {queue['coalesced']} coalesced).", file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning import DATA_FILES, clean_data, clean_round_data, format_historical_data, load_data, resolve_data_dir
+
+SECTIONS = ("data", "documents", "vector_store", "retrieval", "e2e")
+
+# Canned answer streamed by the stub Ollama server, one token per word
+STUB_RESPONSE = (
+    "1. Red Bull - 780 points\n2. McLaren - 640 points\n3. Ferrari - 610 points\n"
+    "4. Mercedes - 470 points\n5. Aston Martin - 90 points\n6. Alpine - 65 points\n"
+    "7. Haas - 55 points\n8. RB - 45 points\n9. Williams - 20 points\n10. Sauber - 5 points\n\n"
+    "Red Bull stays ahead on consistency. McLaren closes the gap with the fastest car late on."
+)
+
+def summarize(samples):
+    """Latency statistics in milliseconds for a list of durations in seconds."""
+    ms = np.asarray(samples) * 1000
+    return {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "min_ms": float(ms.min()),
+        "max_ms": float(ms.max()),
+    }
+
+def measure(fn, repeat=20, warmup=1):
+    """Call fn warmup + repeat times and summarize the timed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def write_scaled_dataset(data_dir, out_dir, scale):
+    """Write a synthetic copy of the CSVs with every season repeated scale times.
+
+    Each copy gets fresh race and standings ids and is shifted by the span of
+    years in the data, so it reads as additional seasons.
+    """
+    constructor_standings, races, constructors = (
+        pd.read_csv(os.path.join(data_dir, name)) for name in DATA_FILES
+    )
+    race_offset = int(races['raceId'].max()) + 1
+    standing_offset = int(constructor_standings['constructorStandingsId'].max()) + 1
+    year_span = int(races['year'].max() - races['year'].min()) + 1
+
+    scaled_races, scaled_standings = [], []
+    for k in range(scale):
+        races_k = races.copy()
+        races_k['raceId'] += k * race_offset
+        races_k['year'] += k * year_span
+        standings_k = constructor_standings.copy()
+        standings_k['raceId'] += k * race_offset
+        standings_k['constructorStandingsId'] += k * standing_offset
+        scaled_races.append(races_k)
+        scaled_standings.append(standings_k)
+
+    os.makedirs(out_dir, exist_ok=True)
+    pd.concat(scaled_standings).to_csv(os.path.join(out_dir, 'constructor_standings.csv'), index=False)
+    pd.concat(scaled_races).to_csv(os.path.join(out_dir, 'races.csv'), index=False)
+    constructors.to_csv(os.path.join(out_dir, 'constructors.csv'), index=False)
+    return out_dir
+
+def bench_data(data_dir, scales, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            scaled_dir = data_dir if scale == 1 else write_scaled_dataset(data_dir, os.path.join(tmp, f"x{scale}"), scale)
+            raw = load_data(scaled_dir, use_snapshot=False)
+            seasonal = clean_data(*raw)
+            params = {"scale": scale, "standings_rows": len(raw[0])}
+            first, last = int(seasonal['year'].min()), int(seasonal['year'].max())
+            results += [
+                {"name": "load_data", "params": params,
+                 **measure(lambda: load_data(scaled_dir, use_snapshot=False), repeat)},
+                {"name": "clean_data", "params": params, **measure(lambda: clean_data(*raw), repeat)},
+                {"name": "clean_round_data", "params": params, **measure(lambda: clean_round_data(*raw), repeat)},
+                {"name": "format_historical_data", "params": params,
+                 **measure(lambda: format_historical_data(seasonal, first, last), repeat)},
+            ]
+    return results
+
+def bench_documents(repeat):
+    from documents import create_f1_documents
+
+    documents, _, _ = create_f1_documents()
+    return [{"name": "create_f1_documents", "params": {"documents": len(documents)},
+             **measure(create_f1_documents, repeat)}]
+
+def _use_temporary_vector_store(tmp):
+    """Point vector_store at a throwaway database and embedding cache."""
+    import vector_store
+
+    vector_store.VECTOR_DB_DIR = os.path.join(tmp, "vector_db")
+    vector_store.EMBEDDING_CACHE_PATH = os.path.join(tmp, "embeddings.sqlite3")
+    vector_store.reset_resources()
+    return vector_store
+
+def bench_vector_store(tmp):
+    """Build the store twice: with an empty embedding cache, then with a warm one."""
+    vector_store = _use_temporary_vector_store(tmp)
+    results = []
+    for cache in ("cold", "warm"):
+        start = time.perf_counter()
+        collection = vector_store.build_vector_store(force_rebuild=True)
+        elapsed = time.perf_counter() - start
+        count = collection.count()
+        results.append({
+            "name": "build_vector_store", "params": {"embedding_cache": cache, "documents": count},
+            **summarize([elapsed]), "docs_per_second": count / elapsed,
+        })
+    return results
+
+def bench_retrieval(repeat, with_chroma, tmp=None):
+    import vector_store
+    from context_builder import CONTEXT_TOKEN_BUDGET, build_context, get_token_counter
+
+    results = [{"name": "get_context_for_prediction", "params": {"mode": "structured"},
+                **measure(lambda: vector_store.get_context_for_prediction(2024, mode="structured"), repeat)}]
+    tokenizer, count = get_token_counter()
+    results.append({"name": "build_context",
+                    "params": {"budget": CONTEXT_TOKEN_BUDGET, "tokenizer": tokenizer,
+                               "tokens": count(build_context(2024)),
+                               "structured_tokens": count(vector_store.get_context_for_prediction(2024))},
+                    **measure(lambda: build_context(2024), repeat)})
+    if with_chroma:
+        if tmp is not None and not os.path.isdir(os.path.join(tmp, "vector_db")):
+            _use_temporary_vector_store(tmp)
+            vector_store.build_vector_store(force_rebuild=True)
+        for mode in ("metadata", "semantic"):
+            results.append({"name": "get_context_for_prediction", "params": {"mode": mode},
+                            **measure(lambda: vector_store.get_context_for_prediction(2024, mode=mode), repeat)})
+        results.append({"name": "query_similar", "params": {"n_results": 10},
+                        **measure(lambda: vector_store.query_similar("Red Bull championship wins"), repeat)})
+    return results
+
+class StubOllama:
+    """Local stand-in for Ollama's /api/generate that streams a canned answer."""
+
+    def __init__(self, response=STUB_RESPONSE, token_delay=0.002):
+        tokens = [token + " " for token in response.split(" ")]
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if not body.get("stream"):
+                    payload = json.dumps({"response": response, "done": True, "eval_count": len(tokens)}).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(token_delay)
+                        self.wfile.write((json.dumps({"response": token, "done": False}) + "\n").encode())
+                        self.wfile.flush()
+                    self.wfile.write((json.dumps({"response": "", "done": True, "eval_count": len(tokens)}) + "\n").encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client stopped early
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def bench_e2e(repeat, token_delay):
+    from ollama_client import OllamaClient, set_client
+    from predict import get_rag_prediction, get_rag_prediction_stream
+
+    def first_token():
+        stream = get_rag_prediction_stream(target_year=2024, use_cache=False)
+        for _ in stream:
+            pass
+        return stream.stats["time_to_first_token"]
+
+    with StubOllama(token_delay=token_delay) as stub:
+        previous = set_client(OllamaClient(base_url=stub.url))
+        try:
+            params = {"token_delay_ms": token_delay * 1000, "stub_tokens": len(STUB_RESPONSE.split(" "))}
+            results = [{"name": "get_rag_prediction", "params": params,
+                        **measure(lambda: get_rag_prediction(target_year=2024, use_cache=False), repeat)}]
+            ttft = summarize([first_token() for _ in range(repeat)])
+            results.append({"name": "rag_stream_time_to_first_token", "params": params, **ttft})
+        finally:
+            set_client(previous)
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(sections=SECTIONS, data_dir=None, scales=(1, 4, 16), repeat=20, token_delay=0.002):
+    """Run the selected benchmark sections; a section that cannot run is recorded as skipped.
+
+    Vector store sections build into a temporary database and embedding
+    cache; the real ones are never touched.
+    """
+    import vector_store
+
+    saved_paths = (vector_store.VECTOR_DB_DIR, vector_store.EMBEDDING_CACHE_PATH)
+    results = []
+    tmp = tempfile.mkdtemp(prefix="f1-bench-")
+    chroma_ok = True
+    steps = {
+        "data": lambda: bench_data(resolve_data_dir(data_dir), scales, repeat),
+        "documents": lambda: bench_documents(repeat),
+        "vector_store": lambda: bench_vector_store(tmp),
+        "retrieval": lambda: bench_retrieval(repeat, chroma_ok, tmp),
+        "e2e": lambda: bench_e2e(max(1, repeat // 4), token_delay),
+    }
+    try:
+        for section in sections:
+            print(f"Running {section}...", file=sys.stderr)
+            try:
+                results += steps[section]()
+            except Exception as e:
+                if section == "vector_store":
+                    chroma_ok = False
+                results.append({"name": section, "params": {}, "skipped": f"{type(e).__name__}: {e}"})
+    finally:
+        if (vector_store.VECTOR_DB_DIR, vector_store.EMBEDDING_CACHE_PATH) != saved_paths:
+            vector_store.VECTOR_DB_DIR, vector_store.EMBEDDING_CACHE_PATH = saved_paths
+            vector_store.reset_resources()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+def _result_key(result):
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+def compare(current, baseline, threshold=0.25, metric="p50_ms"):
+    """List results whose metric grew by more than threshold relative to a baseline run."""
+    previous = {_result_key(r): r for r in baseline["results"] if metric in r}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(_result_key(result))
+        if before is None or metric not in result or before[metric] <= 0:
+            continue
+        change = result[metric] / before[metric] - 1
+        if change > threshold:
+            regressions.append({"name": result["name"], "params": result["params"],
+                                "before": before[metric], "after": result[metric], "change": change})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark data loading, retrieval, prompt assembly and generation.")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--data-dir", help="Data directory (default: the active dataset version)")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1, 4, 16],
+                        help="Synthetic dataset sizes, as multiples of the real standings")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--token-delay-ms", type=float, default=2.0, help="Per-token delay of the stub Ollama")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="Baseline results JSON; exit with status 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative p50 slowdown")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sections, args.data_dir, args.scales, args.repeat, args.token_delay_ms / 1000)
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['name']} {regression['params']}: "
+              f"{regression['before']:.2f} -> {regression['after']:.2f} ms ({regression['change']:+.0%})",
+              file=sys.stderr)
+    return 1 if report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
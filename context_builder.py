@@ -0,0 +1,166 @@
+import os
+import re
+import threading
+
+from documents import get_document_index
+from tracing import span
+
+# Tokens of retrieved data allowed in a prompt
+CONTEXT_TOKEN_BUDGET = 1024
+
+# Hugging Face tokenizer (name or local path) to count with, e.g. the served model's
+TOKENIZER_ENV = "F1_TOKENIZER"
+
+# Fallback count: the GPT-4 / Llama 3 BPE pre-tokenizer split; each piece is about one token in this data
+_PIECES = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[A-Za-z]+| ?\d{1,3}| ?[^\sA-Za-z\d]+|\s+")
+
+# One row per team and season; the position order of a season is kept
+HEADER = "year|pos|team|pts|wins\n"
+
+_tokenizer = {"name": None, "count": None}
+_tokenizer_lock = threading.Lock()
+
+def _load_tokenizer():
+    """(name, count function) of the best tokenizer available.
+
+    F1_TOKENIZER loads a Hugging Face tokenizer (transformers is imported only
+    then); otherwise tiktoken's cl100k_base, which Llama 3's vocabulary extends;
+    otherwise an estimate from the pre-tokenizer split.
+    """
+    name = os.environ.get(TOKENIZER_ENV)
+    if name:
+        try:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(name)
+            return name, lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            print(f"Could not load tokenizer {name} ({type(e).__name__}: {e}); falling back.")
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "cl100k_base", lambda text: len(encoding.encode(text))
+    except Exception as e:
+        print(f"Could not load tiktoken ({type(e).__name__}: {e}); estimating token counts for the "
+              f"context budget. Install tiktoken or set {TOKENIZER_ENV} for exact counts.")
+        return "estimate", lambda text: len(_PIECES.findall(text))
+
+def get_token_counter():
+    """(name, count function) of the tokenizer used for budgets, loaded once per process."""
+    with _tokenizer_lock:
+        if _tokenizer["count"] is None:
+            _tokenizer["name"], _tokenizer["count"] = _load_tokenizer()
+        return _tokenizer["name"], _tokenizer["count"]
+
+def count_tokens(text):
+    return get_token_counter()[1](text)
+
+def render_row(metadata):
+    """One table row from a document's metadata (see documents.create_f1_documents)."""
+    return (f"{metadata['year']}|{metadata['position']}|{metadata['constructor']}|"
+            f"{metadata['points']:g}|{metadata['wins']}\n")
+
+def select_rows(rows, budget=CONTEXT_TOKEN_BUDGET, count=None):
+    """The rows (standings metadatas) that fit in budget tokens with the header.
+
+    The newest seasons are kept first, and a season that only partly fits
+    keeps its top positions.
+    """
+    count = count or get_token_counter()[1]
+    used = count(HEADER)
+    kept = []
+    for metadata in sorted(rows, key=lambda m: (-m['year'], m['position'])):
+        tokens = count(render_row(metadata))
+        if used + tokens > budget:
+            break
+        kept.append(metadata)
+        used += tokens
+    return kept
+
+def fit_budget(rows, extras=(), budget=CONTEXT_TOKEN_BUDGET, count=None):
+    """Render rows and extra lines as one table within budget tokens.
+
+    rows are standings metadatas, kept as select_rows does. extras (rendered
+    rows or notes from a query) fill whatever budget is left. Returns
+    (text, stats).
+    """
+    count = count or get_token_counter()[1]
+    used = count(HEADER)
+    kept = []
+    for metadata in select_rows(rows, budget, count):
+        line = render_row(metadata)
+        kept.append((metadata['year'], metadata['position'], line))
+        used += count(line)
+    kept_extras = []
+    for line in extras:
+        tokens = count(line)
+        if used + tokens <= budget:
+            kept_extras.append(line)
+            used += tokens
+    text = HEADER + "".join(line for _, _, line in sorted(kept))
+    if kept_extras:
+        text += "\nRelated:\n" + "".join(kept_extras)
+    stats = {"tokens": used, "rows": len(kept), "rows_dropped": len(rows) - len(kept),
+             "extras": len(kept_extras), "extras_dropped": len(extras) - len(kept_extras)}
+    return text.rstrip("\n"), stats
+
+def _query_hits(query, n_results):
+    """(document, metadata) pairs of query_similar's results."""
+    from vector_store import query_similar
+
+    results = query_similar(query, n_results=n_results)
+    return list(zip(results['documents'][0], results['metadatas'][0]))
+
+def _query_extras(hits, kept):
+    """Rendered query hits that the kept table rows do not already hold."""
+    covered = {(m['year'], m['constructor']) for m in kept}
+    covered_years = {year for year, _ in covered}
+    seen = set(covered)
+    extras = []
+    for document, metadata in hits:
+        key = (metadata['year'], metadata['constructor'])
+        # A season summary only repeats the top of a season that is in the table
+        if key in seen or (metadata['constructor'] == "SUMMARY" and metadata['year'] in covered_years):
+            continue
+        seen.add(key)
+        extras.append(document + "\n" if metadata['constructor'] == "SUMMARY" else render_row(metadata))
+    return extras
+
+def build_context(target_year, n_recent_years=4, query="", budget=CONTEXT_TOKEN_BUDGET, n_query_results=5):
+    """Compact RAG context: the n_recent_years seasons before target_year as a table.
+
+    It holds the same standings as get_context_for_prediction's structured
+    lookup, without the prose and the season summaries (which repeat the top
+    of each season). Results of an optional query take the place of the
+    oldest rows, minus the ones the rows that still fit already cover, and the
+    whole context fits in budget tokens.
+    """
+    with span("retrieval", mode="table") as current:
+        index = get_document_index()
+        positions = index.lookup(min_year=target_year - n_recent_years, max_year=target_year - 1,
+                                 include_summaries=False)
+        rows = [index.metadatas[i] for i in positions]
+        kept = select_rows(rows, budget)
+        extras = []
+        if query:
+            hits = _query_hits(query, n_query_results)
+            # Make room for the hits the table lacks, then dedupe against the rows still kept:
+            # a hit for a dropped row carries information the table no longer has
+            reserve = sum(count_tokens(line) for line in _query_extras(hits, kept))
+            if reserve:
+                kept = select_rows(rows, budget - reserve)
+            extras = _query_extras(hits, kept)
+        text, stats = fit_budget(kept, extras, budget)
+        stats["rows_dropped"] = len(rows) - stats["rows"]
+        current.attrs.update(stats, tokenizer=get_token_counter()[0])
+        return text
+
+if __name__ == "__main__":
+    from vector_store import get_context_for_prediction
+
+    name, count = get_token_counter()
+    verbose = get_context_for_prediction(2024)
+    compact = build_context(2024)
+    print(compact)
+    print(f"\n{count(verbose)} -> {count(compact)} tokens ({name})")
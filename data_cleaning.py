@@ -1,13 +1,60 @@
 import pandas as pd
+import hashlib
 import os
+import threading
 
-def load_data(data_dir='data'):
-    """Load all required CSV files."""
-    constructor_standings = pd.read_csv(os.path.join(data_dir, 'constructor_standings.csv'))
-    races = pd.read_csv(os.path.join(data_dir, 'races.csv'))
-    constructors = pd.read_csv(os.path.join(data_dir, 'constructors.csv'))
-    return constructor_standings, races, constructors
+from tracing import span, traced
 
+DATA_FILES = ('constructor_standings.csv', 'races.csv', 'constructors.csv')
+
+# Process-wide cache of cleaned seasonal data, one entry per data directory
+_SEASONAL_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+# Callbacks run with the data directory (None for all) and the changes (None if unknown)
+# when cached data is reloaded, cleared or switched to another version
+_REFRESH_HOOKS = []
+
+# Data directory used when none is given; F1_DATA_DIR overrides the registry's active version
+DEFAULT_DATA_DIR = 'data'
+_ACTIVE = {'data_dir': os.environ.get('F1_DATA_DIR')}
+
+def get_active_data_dir():
+    """The data directory every function uses by default (see dataset_registry.activate)."""
+    if _ACTIVE['data_dir'] is None:
+        from dataset_registry import load_active_dir
+        _ACTIVE['data_dir'] = load_active_dir(DEFAULT_DATA_DIR)
+    return _ACTIVE['data_dir']
+
+def set_active_data_dir(data_dir, changes=None):
+    """Point the default data directory at data_dir; readers see either the old or the new one."""
+    _ACTIVE['data_dir'] = data_dir
+    _notify_refresh(data_dir, changes)
+
+def resolve_data_dir(data_dir=None):
+    return get_active_data_dir() if data_dir is None else data_dir
+
+def load_data(data_dir=None, use_snapshot=True):
+    """Load all required CSV files.
+
+    If a fresh binary snapshot exists (see snapshot.py) it is memory-mapped instead
+    of parsing the CSVs; it only holds the columns clean_data needs.
+    """
+    data_dir = resolve_data_dir(data_dir)
+    with span("load_data", data_dir=data_dir) as current:
+        if use_snapshot:
+            from snapshot import load_snapshot
+            frames = load_snapshot(data_dir)
+            if frames is not None:
+                current.attrs["source"] = "snapshot"
+                return frames
+        current.attrs["source"] = "csv"
+        constructor_standings = pd.read_csv(os.path.join(data_dir, 'constructor_standings.csv'))
+        races = pd.read_csv(os.path.join(data_dir, 'races.csv'))
+        constructors = pd.read_csv(os.path.join(data_dir, 'constructors.csv'))
+        return constructor_standings, races, constructors
+
+@traced("clean_data")
 def clean_data(constructor_standings, races, constructors):
     """Clean and merge the data."""
     # Merge to get year and round
@@ -28,28 +75,213 @@ def clean_data(constructor_standings, races, constructors):
     
     return seasonal
 
-def get_seasonal_data(start_year=2020, end_year=2023):
+@traced("clean_round_data")
+def clean_round_data(constructor_standings, races, constructors):
+    """Clean and merge the data at round granularity: standings after every round.
+
+    race_points is the points scored in that round alone (the difference of
+    the cumulative standings points from the previous round).
+    """
+    merged = pd.merge(constructor_standings, races[['raceId', 'year', 'round']], on='raceId')
+    cleaned = merged[['year', 'round', 'constructorId', 'points', 'position', 'wins']].dropna()
+    cleaned = cleaned.sort_values(['year', 'constructorId', 'round'])
+    cleaned['race_points'] = cleaned.groupby(['year', 'constructorId'])['points'].diff().fillna(cleaned['points'])
+    rounds = pd.merge(cleaned, constructors[['constructorId', 'name']], on='constructorId')
+    return rounds.sort_values(['year', 'round', 'position']).reset_index(drop=True)
+
+def _raw_for_years(raw, years):
+    """The rows of the raw tables that feed the given seasons."""
+    constructor_standings, races, constructors = raw
+    races = races[races['year'].isin(years)]
+    return constructor_standings[constructor_standings['raceId'].isin(races['raceId'])], races, constructors
+
+def _splice_years(frame, patch, years, by, ascending=True):
+    # Both parts are in final order, so a stable sort gives the same rows and ties as a full clean
+    kept = frame[~frame['year'].isin(years)]
+    return pd.concat([kept, patch]).sort_values(by, ascending=ascending, kind='stable').reset_index(drop=True)
+
+@traced("patch_data")
+def patch_seasonal(seasonal, raw, years):
+    """Re-clean only the given seasons from raw and splice them into an existing seasonal frame."""
+    if not years:
+        return seasonal
+    patch = clean_data(*_raw_for_years(raw, years))
+    return _splice_years(seasonal, patch, years, ['year', 'points'], [True, False])
+
+@traced("patch_data")
+def patch_rounds(rounds, raw, years):
+    """Round-level counterpart of patch_seasonal."""
+    if not years:
+        return rounds
+    patch = clean_round_data(*_raw_for_years(raw, years))
+    return _splice_years(rounds, patch, years, ['year', 'round', 'position'])
+
+def _file_signature(path, previous=None):
+    """Return (mtime_ns, size, sha256) for a file, reusing the hash if unchanged."""
+    stat = os.stat(path)
+    if previous is not None and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+        return previous
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return (stat.st_mtime_ns, stat.st_size, digest)
+
+def _data_signature(data_dir, previous=None):
+    """Signature of all source files in a data directory."""
+    previous = previous or {}
+    return {
+        name: _file_signature(os.path.join(data_dir, name), previous.get(name))
+        for name in DATA_FILES
+    }
+
+def _same_content(a, b):
+    return {k: v[2] for k, v in a.items()} == {k: v[2] for k, v in b.items()}
+
+def signature_version(signature):
+    """Content hash of a data directory from its _data_signature."""
+    return hashlib.sha256(''.join(signature[name][2] for name in DATA_FILES).encode()).hexdigest()[:16]
+
+def _build_entry(data_dir, signature, previous=None):
+    """Load data_dir into a cache entry.
+
+    With a previous entry (the same directory before it changed, or another
+    version of the data) the raw tables are diffed against it and only the
+    seasons that differ are re-cleaned; entry['changes'] records the diff.
+    """
+    raw = load_data(data_dir)
+    entry = {'signature': signature, 'version': signature_version(signature), 'raw': raw, 'changes': None}
+    if previous is None:
+        entry['seasonal'] = clean_data(*raw)
+    else:
+        from dataset_registry import affected_years, diff_raw
+
+        diff = diff_raw(previous['raw'], raw)
+        years = affected_years(diff, previous['raw'], raw)
+        entry['changes'] = {'from': previous['version'], 'to': entry['version'], 'diff': diff, 'years': years}
+        entry['seasonal'] = patch_seasonal(previous['seasonal'], raw, years)
+        if 'rounds' in previous:
+            entry['rounds'] = patch_rounds(previous['rounds'], raw, years)
+    entry['years'] = entry['seasonal']['year'].to_numpy()
+    return entry
+
+def _get_cache_entry(data_dir=None, base_dir=None):
+    """Return the cache entry for data_dir, (re)building it if the sources changed.
+
+    A changed directory is patched from its previous entry; a directory that is
+    not cached yet is patched from base_dir's entry if that one is cached.
+    """
+    data_dir = resolve_data_dir(data_dir)
+    key = os.path.abspath(data_dir)
+    with _CACHE_LOCK:
+        entry = _SEASONAL_CACHE.get(key)
+        signature = _data_signature(data_dir, entry['signature'] if entry else None)
+        if entry is not None and _same_content(entry['signature'], signature):
+            entry['signature'] = signature
+            return entry
+
+        refreshed = entry is not None
+        previous = entry if refreshed else _SEASONAL_CACHE.get(os.path.abspath(base_dir)) if base_dir else None
+        entry = _build_entry(data_dir, signature, previous)
+        _SEASONAL_CACHE[key] = entry
+    # Outside the lock, so hooks can read the fresh data
+    if refreshed:
+        _notify_refresh(data_dir, entry['changes'])
+    return entry
+
+def load_data_dir(data_dir, base_dir=None):
+    """Load data_dir into the cache (patched from base_dir's cached data when possible).
+
+    Returns the changes relative to the entry it was derived from, or None if
+    it was loaded from scratch or was already cached.
+    """
+    return _get_cache_entry(data_dir, base_dir)['changes']
+
+def on_data_refresh(callback):
+    """Register callback(data_dir, changes) to run when the data changes or the cache is cleared.
+
+    changes is None when the extent of the change is unknown; otherwise it has
+    the row-level diff and the affected seasons (see dataset_registry.diff_raw).
+    """
+    _REFRESH_HOOKS.append(callback)
+    return callback
+
+def _notify_refresh(data_dir, changes=None):
+    for callback in list(_REFRESH_HOOKS):
+        callback(data_dir, changes)
+
+def get_raw_data(data_dir=None):
+    """Get the (constructor_standings, races, constructors) tables from the cache."""
+    return _get_cache_entry(data_dir)['raw']
+
+def get_data_version(data_dir=None):
+    """Short hash of the source files' contents; use it as a cache key for derived data."""
+    return _get_cache_entry(data_dir)['version']
+
+def get_cleaned_data(data_dir=None):
+    """Get the full cleaned seasonal frame, parsing and merging the CSVs only once.
+
+    The cache is keyed on the source files' mtimes and content hashes: a touched
+    but unchanged file only costs a re-hash, a changed file triggers a reload.
+    """
+    return _get_cache_entry(data_dir)['seasonal']
+
+def get_constructors(data_dir=None):
+    """Get the constructors table from the cache."""
+    return _get_cache_entry(data_dir)['raw'][2]
+
+def get_round_data(data_dir=None):
+    """Get standings after every round (see clean_round_data), cached like get_cleaned_data."""
+    entry = _get_cache_entry(data_dir)
+    with _CACHE_LOCK:
+        if 'rounds' not in entry:
+            entry['rounds'] = clean_round_data(*entry['raw'])
+        return entry['rounds']
+
+def get_season_lengths(data_dir=None):
+    """Get the number of scheduled rounds per season, indexed by year."""
+    entry = _get_cache_entry(data_dir)
+    with _CACHE_LOCK:
+        if 'season_lengths' not in entry:
+            races = entry['raw'][1]
+            entry['season_lengths'] = races.groupby('year')['round'].max()
+        return entry['season_lengths']
+
+def clear_cache(data_dir=None):
+    """Drop cached seasonal data for one data directory, or for all of them."""
+    with _CACHE_LOCK:
+        if data_dir is None:
+            _SEASONAL_CACHE.clear()
+        else:
+            _SEASONAL_CACHE.pop(os.path.abspath(data_dir), None)
+    _notify_refresh(data_dir)
+
+def get_seasonal_data(start_year=2020, end_year=2023, data_dir=None):
     """Get cleaned seasonal data for specified year range."""
-    constructor_standings, races, constructors = load_data()
-    seasonal = clean_data(constructor_standings, races, constructors)
-    seasonal = seasonal[(seasonal['year'] >= start_year) & (seasonal['year'] <= end_year)]
-    return seasonal
+    entry = _get_cache_entry(data_dir)
+    seasonal, years = entry['seasonal'], entry['years']
+    # seasonal is sorted by year, so a year range is a contiguous positional slice
+    lo = years.searchsorted(start_year, side='left')
+    hi = years.searchsorted(end_year, side='right')
+    return seasonal.iloc[lo:hi]
+
+def render_standings_lines(seasonal):
+    """Render one "name: points points, position P, W wins" line per row, vectorized."""
+    return (
+        seasonal['name'].astype(str) + ': ' + seasonal['points'].astype(str) + ' points, position '
+        + seasonal['position'].astype(str) + ', ' + seasonal['wins'].astype(str) + ' wins\n'
+    )
 
 def format_historical_data(seasonal, start_year=2020, end_year=2023):
     """Format seasonal data as text for LLM."""
-    historical_data = ""
-    for year in range(start_year, end_year + 1):
-        year_data = seasonal[seasonal['year'] == year]
-        historical_data += f"Season {year}:\n"
-        for _, row in year_data.iterrows():
-            historical_data += f"{row['name']}: {row['points']} points, position {row['position']}, {row['wins']} wins\n"
-        historical_data += "\n"
-    return historical_data
-
-def get_available_years():
+    seasonal = seasonal[(seasonal['year'] >= start_year) & (seasonal['year'] <= end_year)]
+    # One groupby pass joins each season's lines; row order within a season is kept
+    blocks = render_standings_lines(seasonal).groupby(seasonal['year'].to_numpy(), sort=False).agg(''.join)
+    return "".join(
+        f"Season {year}:\n{blocks.get(year, '')}\n" for year in range(start_year, end_year + 1)
+    )
+
+def get_available_years(data_dir=None):
     """Get list of available years in the dataset."""
-    constructor_standings, races, constructors = load_data()
-    seasonal = clean_data(constructor_standings, races, constructors)
+    seasonal = get_cleaned_data(data_dir)
     return sorted(seasonal['year'].unique().tolist())
 
 if __name__ == "__main__":
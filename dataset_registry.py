@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_cleaning
+from data_cleaning import DATA_FILES, _data_signature, signature_version
+from snapshot import SNAPSHOT_COLUMNS
+
+# Registered dataset versions and the active one; override with F1_DATA_REGISTRY
+REGISTRY_PATH = os.environ.get(
+    "F1_DATA_REGISTRY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_registry.json")
+)
+
+# Row keys of each table. Only the SNAPSHOT_COLUMNS are compared: no other column reaches derived data
+TABLE_KEYS = {
+    'constructor_standings.csv': ['raceId', 'constructorId'],
+    'races.csv': ['raceId'],
+    'constructors.csv': ['constructorId'],
+}
+
+_lock = threading.RLock()
+
+def _base_dir():
+    return os.path.dirname(os.path.abspath(REGISTRY_PATH))
+
+def _read_registry():
+    try:
+        with open(REGISTRY_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"active": None, "versions": {}}
+
+def _write_registry(registry):
+    # Write then rename, so readers never see a half-written registry
+    tmp = REGISTRY_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(registry, f, indent=2)
+    os.replace(tmp, REGISTRY_PATH)
+
+def _stored_dir(data_dir):
+    """Directories inside the repo are stored relative to it, so the registry survives a move."""
+    path = os.path.abspath(data_dir)
+    relative = os.path.relpath(path, _base_dir())
+    return path if relative.startswith("..") else relative
+
+def _full_dir(stored):
+    return os.path.join(_base_dir(), stored)
+
+def register(data_dir, name=None):
+    """Record the current contents of data_dir as a version, keyed on their content hash.
+
+    Directories with identical contents share one version; a directory whose
+    files changed since it was registered becomes a new version.
+    """
+    signature = _data_signature(data_dir)
+    version_id = signature_version(signature)
+    stored = _stored_dir(data_dir)
+    with _lock:
+        registry = _read_registry()
+        version = registry["versions"].setdefault(version_id, {
+            "id": version_id,
+            "files": {table: signature[table][2] for table in DATA_FILES},
+            "dirs": [],
+            "names": [],
+            "registered": time.time(),
+        })
+        # A directory or name points at one version only: its latest contents
+        for other in registry["versions"].values():
+            if other is not version:
+                other["dirs"] = [d for d in other["dirs"] if d != stored]
+                other["names"] = [n for n in other["names"] if n != name]
+        if stored not in version["dirs"]:
+            version["dirs"].append(stored)
+        if name and name not in version["names"]:
+            version["names"].append(name)
+        _write_registry(registry)
+    return version
+
+def list_versions():
+    """Registered versions, oldest first."""
+    return sorted(_read_registry()["versions"].values(), key=lambda version: version["registered"])
+
+def get_version(ref):
+    """Find a version by id (or unique id prefix), name or directory; None if there is no match."""
+    versions = _read_registry()["versions"]
+    if ref in versions:
+        return versions[ref]
+    by_name = [v for v in versions.values() if ref in v["names"]]
+    by_dir = [v for v in versions.values() if _stored_dir(ref) in v["dirs"]]
+    by_prefix = [v for v in versions.values() if v["id"].startswith(ref)]
+    for matches in (by_name, by_dir, by_prefix):
+        if len(matches) == 1:
+            return matches[0]
+    return None
+
+def _version_dir(version):
+    """A registered directory that still holds exactly this version's contents."""
+    for stored in version["dirs"]:
+        path = _full_dir(stored)
+        try:
+            signature = _data_signature(path)
+        except OSError:
+            continue
+        if signature_version(signature) == version["id"]:
+            return path
+    return None
+
+def load_active_dir(default='data'):
+    """Directory of the active version, or default when none was activated (or it is gone)."""
+    registry = _read_registry()
+    version = registry["versions"].get(registry.get("active"))
+    return (_version_dir(version) if version else None) or default
+
+def active_version():
+    """The registered version matching the active data directory's contents (None if unregistered)."""
+    version_id = data_cleaning.get_data_version()
+    return _read_registry()["versions"].get(version_id)
+
+def _normalize(frame, table):
+    """The compared columns of a raw table with uniform dtypes (CSV and snapshot loads differ)."""
+    columns = {}
+    for column, dtype in SNAPSHOT_COLUMNS[table].items():
+        values = frame[column]
+        columns[column] = values.astype(str) if dtype is str else pd.to_numeric(values, errors='coerce')
+    return pd.DataFrame(columns)
+
+def diff_table(old, new, keys):
+    """Row-level diff of two frames with the same columns, matched on keys.
+
+    Returns {"added": new rows, "removed": old rows, "changed": keys with the
+    old and new values of every compared column}.
+    """
+    merged = old.merge(new, on=keys, how='outer', suffixes=('_old', '_new'), indicator=True)
+    values = [column for column in old.columns if column not in keys]
+    old_columns = [f"{column}_old" for column in values]
+    new_columns = [f"{column}_new" for column in values]
+    both = merged[merged['_merge'] == 'both']
+    differs = np.zeros(len(both), dtype=bool)
+    for column in values:
+        a, b = both[f"{column}_old"], both[f"{column}_new"]
+        differs |= ~((a == b) | (a.isna() & b.isna())).to_numpy()
+    rename = lambda suffix: {f"{column}{suffix}": column for column in values}
+    return {
+        "added": merged.loc[merged['_merge'] == 'right_only', keys + new_columns].rename(columns=rename("_new")),
+        "removed": merged.loc[merged['_merge'] == 'left_only', keys + old_columns].rename(columns=rename("_old")),
+        "changed": both.loc[differs, keys + old_columns + new_columns],
+    }
+
+def diff_raw(old_raw, new_raw):
+    """Row-level diff of two (constructor_standings, races, constructors) tuples, per table."""
+    return {
+        table: diff_table(_normalize(old, table), _normalize(new, table), TABLE_KEYS[table])
+        for table, old, new in zip(DATA_FILES, old_raw, new_raw)
+    }
+
+def affected_years(diff, old_raw, new_raw):
+    """Sorted seasons whose cleaned data can differ between old_raw and new_raw."""
+    races = pd.concat([_normalize(old_raw[1], 'races.csv'), _normalize(new_raw[1], 'races.csv')])
+    years = set()
+
+    # Standings rows affect the season of their race, before and after the change
+    standings = diff['constructor_standings.csv']
+    race_ids = pd.concat([standings[kind]['raceId'] for kind in ("added", "removed", "changed")])
+    years.update(races.loc[races['raceId'].isin(race_ids), 'year'].dropna())
+
+    # A changed race can move between seasons or rounds
+    race_diff = diff['races.csv']
+    for frame, columns in ((race_diff["added"], ['year']), (race_diff["removed"], ['year']),
+                           (race_diff["changed"], ['year_old', 'year_new'])):
+        for column in columns:
+            years.update(frame[column].dropna())
+
+    # A renamed or removed constructor changes every season it scored in
+    constructor_diff = diff['constructors.csv']
+    constructor_ids = pd.concat([constructor_diff[kind]['constructorId'] for kind in ("removed", "changed")])
+    if len(constructor_ids):
+        standings = pd.concat([_normalize(old_raw[0], 'constructor_standings.csv'),
+                               _normalize(new_raw[0], 'constructor_standings.csv')])
+        race_ids = standings.loc[standings['constructorId'].isin(constructor_ids), 'raceId']
+        years.update(races.loc[races['raceId'].isin(race_ids), 'year'].dropna())
+    return sorted(int(year) for year in years)
+
+def summarize_diff(diff):
+    """Row counts per table and kind of change."""
+    return {table: {kind: len(rows) for kind, rows in changes.items()} for table, changes in diff.items()}
+
+def diff_versions(old_ref, new_ref):
+    """Row-level diff and affected seasons between two registered versions (or directories)."""
+    return _diff_dirs(_resolve_dir(old_ref), _resolve_dir(new_ref))
+
+def _diff_dirs(old_dir, new_dir):
+    old_raw, new_raw = data_cleaning.get_raw_data(old_dir), data_cleaning.get_raw_data(new_dir)
+    diff = diff_raw(old_raw, new_raw)
+    return diff, affected_years(diff, old_raw, new_raw)
+
+def _resolve_dir(ref):
+    version = get_version(ref)
+    if version is None:
+        if os.path.isdir(ref):
+            return ref
+        raise ValueError(f"Unknown dataset version: {ref}")
+    path = _version_dir(version)
+    if path is None:
+        raise ValueError(f"No directory holds version {version['id']} any more")
+    return path
+
+def _invalidate_downstream(years, data_dir, sync_index):
+    """Drop cached predictions for the affected seasons and mark their documents for re-embedding.
+
+    With sync_index they are re-embedded now; otherwise the next vector store
+    retrieval in this process does it first (see vector_store.sync_pending).
+    """
+    report = {"predictions_dropped": 0, "index_synced": False}
+    if not years:
+        return report
+    from prediction_cache import get_cache
+    from vector_store import mark_stale, sync_pending
+
+    report["predictions_dropped"] = get_cache().invalidate_years(years)
+    mark_stale(years, data_dir)
+    if sync_index:
+        sync_pending()
+        report["index_synced"] = True
+    return report
+
+def activate(ref, sync_index=False):
+    """Switch the active dataset version at runtime.
+
+    The new version is loaded and cleaned next to the old one (only the seasons
+    that differ are re-cleaned), then the default data directory is swapped in
+    one step, so requests keep being served from the old version until the new
+    one is ready. Cached predictions for the affected seasons are dropped, and
+    the vector store re-embeds only those seasons' documents, right away with
+    sync_index or else before its next retrieval. The old version stays
+    cached, so switching back is instant.
+    """
+    start = time.perf_counter()
+    with _lock:
+        if os.path.isdir(ref):
+            register(ref)
+        new_dir = _resolve_dir(ref)
+        old_dir = data_cleaning.get_active_data_dir()
+        old_version = data_cleaning.get_data_version(old_dir)
+
+        changes = data_cleaning.load_data_dir(new_dir, base_dir=old_dir)
+        if changes is None or changes['from'] != old_version:
+            diff, years = _diff_dirs(old_dir, new_dir)
+            changes = {'from': old_version, 'to': data_cleaning.get_data_version(new_dir), 'diff': diff, 'years': years}
+
+        data_cleaning.set_active_data_dir(new_dir, changes)
+        registry = _read_registry()
+        registry["active"] = changes['to']
+        _write_registry(registry)
+        report = _invalidate_downstream(changes['years'], new_dir, sync_index)
+    return {
+        "from": changes['from'],
+        "to": changes['to'],
+        "data_dir": new_dir,
+        "years": changes['years'],
+        "rows": summarize_diff(changes['diff']),
+        "seconds": time.perf_counter() - start,
+        **report,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Register, compare and switch dataset versions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("register", help="Register a data directory's current contents")
+    add.add_argument("data_dir")
+    add.add_argument("--name")
+    commands.add_parser("list", help="List registered versions")
+    diff = commands.add_parser("diff", help="Row-level diff between two versions")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    switch = commands.add_parser("activate", help="Make a version the default data")
+    switch.add_argument("ref", help="Version id (or prefix), name or directory")
+    switch.add_argument("--sync-index", action="store_true", help="Re-embed the affected seasons in the vector store")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "register":
+        version = register(args.data_dir, args.name)
+        print(f"{version['id']}  dirs={version['dirs']} names={version['names']}")
+    elif args.command == "list":
+        active = _read_registry().get("active")
+        for version in list_versions():
+            marker = "*" if version["id"] == active else " "
+            print(f"{marker} {version['id']}  dirs={version['dirs']} names={version['names']}")
+    elif args.command == "diff":
+        diff, years = diff_versions(args.old, args.new)
+        for table, counts in summarize_diff(diff).items():
+            print(f"{table:<28} " + "  ".join(f"{kind} {count}" for kind, count in counts.items()))
+        print(f"Affected seasons: {', '.join(map(str, years)) or 'none'}")
+    else:
+        report = activate(args.ref, args.sync_index)
+        print(f"Active: {report['to']} ({report['data_dir']}), was {report['from']}; "
+              f"{len(report['years'])} seasons changed, {report['predictions_dropped']} cached predictions dropped "
+              f"in {report['seconds']:.2f}s")
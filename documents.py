@@ -0,0 +1,108 @@
+import bisect
+import threading
+from collections import defaultdict
+
+from data_cleaning import get_cleaned_data
+
+def create_f1_documents(seasonal=None):
+    """Create documents from F1 data for vector storage."""
+    if seasonal is None:
+        seasonal = get_cleaned_data()
+    
+    years = seasonal['year'].astype(int)
+    names = seasonal['name'].astype(str)
+    positions = seasonal['position'].astype(int)
+    wins = seasonal['wins'].astype(int)
+    
+    # Create documents for each season-constructor combination
+    documents = (
+        "In the " + years.astype(str) + " F1 season, " + names + " finished in position "
+        + positions.astype(str) + " with " + seasonal['points'].astype(str) + " points and "
+        + wins.astype(str) + " race wins."
+    ).tolist()
+    ids = (years.astype(str) + "_" + names.str.replace(' ', '_')).tolist()
+    metadatas = [
+        {"year": year, "constructor": name, "points": points, "position": position, "wins": win}
+        for year, name, points, position, win in zip(
+            years.tolist(), names.tolist(), seasonal['points'].astype(float).tolist(),
+            positions.tolist(), wins.tolist()
+        )
+    ]
+    
+    # Create season summary documents from the top 3 of each season in one groupby pass
+    top_3 = seasonal.sort_values(['year', 'points'], ascending=[True, False], kind='stable')
+    top_3 = top_3.groupby('year', sort=True).head(3)
+    ranks = top_3.groupby('year').cumcount()
+    champions = top_3[ranks == 0].set_index('year')
+    second = top_3[ranks == 1].set_index('year')['name']
+    third = top_3[ranks == 2].set_index('year')['name']
+    summary_years = champions.index.astype(int).astype(str)
+    summaries = (
+        "Season " + summary_years + " Summary: " + champions['name'].astype(str) + " won the championship with "
+        + champions['points'].astype(str) + " points and " + champions['wins'].astype(int).astype(str) + " wins. "
+        + "Top 3: 1. " + champions['name'].astype(str) + ", 2. " + second.astype(str)
+        + ", 3. " + third.astype(str) + "."
+    )
+    
+    documents.extend(summaries.tolist())
+    metadatas.extend(
+        {"year": int(year), "constructor": "SUMMARY", "points": 0.0, "position": 0, "wins": 0}
+        for year in champions.index
+    )
+    ids.extend((summary_years + "_SUMMARY").tolist())
+    
+    return documents, metadatas, ids
+
+
+class DocumentIndex:
+    """In-memory index of the F1 documents for exact year/constructor/position lookups."""
+
+    def __init__(self, documents, metadatas, ids):
+        self.documents = documents
+        self.metadatas = metadatas
+        self.ids = ids
+        self._by_year = defaultdict(list)
+        self._by_constructor = defaultdict(set)
+        for i, metadata in enumerate(metadatas):
+            self._by_year[metadata["year"]].append(i)
+            self._by_constructor[metadata["constructor"]].add(i)
+        # Within a season, put the summary first and then the standings in order
+        for positions in self._by_year.values():
+            positions.sort(key=lambda i: (metadatas[i]["constructor"] != "SUMMARY", i))
+        self.years = sorted(self._by_year)
+
+    def lookup(self, min_year=None, max_year=None, constructor=None, position=None,
+               include_summaries=True):
+        """Return the matching documents' indices, oldest season first."""
+        lo = 0 if min_year is None else bisect.bisect_left(self.years, min_year)
+        hi = len(self.years) if max_year is None else bisect.bisect_right(self.years, max_year)
+        constructor_rows = self._by_constructor.get(constructor, set()) if constructor else None
+        matches = []
+        for year in self.years[lo:hi]:
+            for i in self._by_year[year]:
+                metadata = self.metadatas[i]
+                if metadata["constructor"] == "SUMMARY":
+                    if not include_summaries or constructor or position is not None:
+                        continue
+                elif constructor_rows is not None and i not in constructor_rows:
+                    continue
+                elif position is not None and metadata["position"] != position:
+                    continue
+                matches.append(i)
+        return matches
+
+    def get_documents(self, **filters):
+        """Return the text of the documents matching lookup(**filters)."""
+        return [self.documents[i] for i in self.lookup(**filters)]
+
+_INDEX = {"seasonal": None, "index": None}
+_INDEX_LOCK = threading.Lock()
+
+def get_document_index():
+    """Get the document index, rebuilding it only when the seasonal data was reloaded."""
+    seasonal = get_cleaned_data()
+    with _INDEX_LOCK:
+        if _INDEX["seasonal"] is not seasonal:
+            _INDEX["index"] = DocumentIndex(*create_f1_documents(seasonal))
+            _INDEX["seasonal"] = seasonal
+        return _INDEX["index"]
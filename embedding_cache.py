@@ -0,0 +1,197 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction
+
+from tracing import span
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "cache", "embeddings.sqlite3")
+
+# SQLite limits the number of bound parameters per statement
+_SQL_CHUNK = 500
+
+# Pending last_used updates at which a lookup writes them out itself
+TOUCH_FLUSH_SIZE = 1024
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different strings share a cache entry."""
+    return " ".join(str(text).split())
+
+def cache_key(model_name, text):
+    """Cache key for a (model, normalized text) pair."""
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """On-disk embedding store with LRU eviction and an in-memory hot layer.
+
+    Lookups only read: the last_used times of hits are buffered and written
+    with the next put_many (before it evicts), on close, or once
+    TOUCH_FLUSH_SIZE keys are pending.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=100_000, memory_entries=1024):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached."""
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                else:
+                    missing.append(key)
+
+            for start in range(0, len(missing), _SQL_CHUNK):
+                chunk = missing[start:start + _SQL_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+        return found
+
+    def _flush_touched(self):
+        # Caller holds the lock and commits
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put_many(self, model_name, items):
+        """Store (key, vector) pairs and evict least recently used entries over the limit."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, vector in items:
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, model_name, vector.shape[0], vector.tobytes(), now))
+            self._flush_touched()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def close(self):
+        """Write the buffered last_used times and close the database."""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Embedding function that serves repeated texts from an EmbeddingCache.
+
+    The wrapped embedding function is only constructed (and its model loaded)
+    the first time a text misses the cache.
+    """
+
+    def __init__(self, model_name, factory, inner_name, cache=None):
+        self.model_name = model_name
+        self._factory = factory
+        self._inner_name = inner_name
+        self._inner = None
+        self._inner_lock = threading.Lock()
+        self.cache = cache or EmbeddingCache()
+
+    @property
+    def loaded(self):
+        """True once the wrapped embedding function has been constructed."""
+        return self._inner is not None
+
+    @property
+    def inner(self):
+        with self._inner_lock:
+            if self._inner is None:
+                self._inner = self._factory()
+            return self._inner
+
+    def __call__(self, input: Documents):
+        with span("embed") as current:
+            embeddings, computed = self._embed(list(input))
+            current.attrs.update(texts=len(embeddings), computed=computed)
+            return embeddings
+
+    def _embed(self, texts):
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, in a single batch
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        if pending:
+            vectors = self.inner(list(pending.values()))
+            computed = list(zip(pending.keys(), vectors))
+            self.cache.put_many(self.model_name, computed)
+            found.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in computed)
+
+        return [found[key] for key in keys], len(pending)
+
+    # Report the wrapped function's identity so Chroma accepts it for existing collections
+    def name(self):
+        return self._inner_name
+
+    def get_config(self):
+        return self.inner.get_config()
+
+    def default_space(self):
+        return self.inner.default_space()
+
+    def supported_spaces(self):
+        return self.inner.supported_spaces()
@@ -1,6 +1,5 @@
 import pandas as pd
-import requests
-import json
+from ollama_client import get_client
 
 # Load data
 constructor_standings = pd.read_csv('data/constructor_standings.csv')
@@ -39,19 +38,13 @@ for year in range(2020, 2024):
 prompt = f"Based on the following recent Formula 1 constructor standings, predict the 2024 season standings in the same format:\n\n{historical_data}\n2024 prediction:"
 
 # Call Llama 3 8B via Ollama
-response = requests.post(
-    "http://localhost:11434/api/generate",
-    json={
-        "model": "llama3:8b",
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": 0.8
-        }
+result = get_client().generate(
+    "llama3:8b",
+    prompt,
+    options={
+        "temperature": 0.8
     }
 )
-
-result = response.json()
 prediction = result.get("response", "")
 
 print("Prediction for 2024:")
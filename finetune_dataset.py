@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+from data_cleaning import get_cleaned_data, get_round_data
+
+# Seasons of history in each season example, and the first season to predict (as in the guide's Cell 3)
+WINDOW = 3
+MIN_YEAR = 2010
+
+# Rows in each ranking answer
+RANKING_LINES = 10
+
+# Examples per output file
+SHARD_SIZE = 5000
+
+# Seasons generated per chunk; bounds memory while streaming to the shards
+CHUNK_YEARS = 16
+
+def _season_blocks(seasonal):
+    """Per year, the "Season Y:" history block and the ranking answer, as two Series indexed by year."""
+    years = seasonal['year'].to_numpy()
+    lines = (
+        "- " + seasonal['name'].astype(str) + ": " + seasonal['points'].astype(str) + " pts, P"
+        + seasonal['position'].astype(int).astype(str) + "\n"
+    )
+    history = lines.groupby(years, sort=True).agg(''.join)
+    history = "Season " + history.index.astype(str) + ":\n" + history + "\n"
+
+    top = seasonal[seasonal.groupby('year').cumcount() < RANKING_LINES]
+    rank = top.groupby('year').cumcount() + 1
+    answer_lines = rank.astype(str) + ". " + top['name'].astype(str) + ": " + top['points'].astype(int).astype(str) + " points\n"
+    answers = answer_lines.groupby(top['year'].to_numpy(), sort=True).agg(''.join)
+    answers = answers.index.astype(str) + " Constructor Championship:\n" + answers
+    return pd.Series(history.to_numpy(), index=history.index), pd.Series(answers.to_numpy(), index=answers.index)
+
+def season_examples(seasonal, years, window=WINDOW):
+    """Season examples in the guide's Cell 3 format: the previous window seasons -> the final ranking.
+
+    Each season's history block is rendered once and reused by the window
+    seasons after it, so the cost is linear in the number of seasons.
+    """
+    history, answers = _season_blocks(seasonal)
+    rows = []
+    for year in years:
+        previous = [history[y] for y in range(year - window, year) if y in history.index]
+        if not previous or year not in answers.index:
+            continue
+        rows.append({
+            "id": f"season-{year}",
+            "kind": "season",
+            "year": year,
+            "round": None,
+            "instruction": f"Predict the {year} F1 Constructor Championship based on recent history:\n\n" + "".join(previous),
+            "response": answers[year],
+        })
+    return pd.DataFrame(rows, columns=["id", "kind", "year", "round", "instruction", "response"])
+
+def season_prompt(seasonal, year, window=WINDOW):
+    """Training-format prompt (guide's Cell 4) to predict year from the window seasons before it.
+
+    Only seasons before year are read, so the prompt holds nothing of the
+    season being predicted.
+    """
+    history, _ = _season_blocks(seasonal[seasonal['year'] < year])
+    previous = "".join(history[y] for y in range(year - window, year) if y in history.index)
+    if not previous:
+        raise ValueError(f"No seasons before {year} to build a prompt from")
+    instruction = f"Predict the {year} F1 Constructor Championship based on recent history:\n\n" + previous
+    return "### Instruction:\n" + instruction + "\n\n### Response:\n"
+
+def round_examples(seasonal, rounds, years, n_champions=3, top_n=3, round_step=1):
+    """Mid-season examples in the HF-GPT2.py prompt format: standings after round R -> final ranking.
+
+    Every round before the last of each season (every round_step-th) gives
+    one example; the prompt matches round_index.build_midseason_prompt.
+    """
+    rounds = rounds[rounds['year'].isin(years)]
+    last_round = rounds.groupby('year')['round'].transform('max')
+    rounds = rounds[(rounds['round'] < last_round) & (rounds['round'] % round_step == 0)]
+    if rounds.empty:
+        return pd.DataFrame(columns=["id", "kind", "year", "round", "instruction", "response"])
+
+    # "Current Standings After Round R:" blocks, one per (year, round)
+    top = rounds[rounds['position'] <= top_n]
+    lines = top['position'].astype(str) + ". " + top['name'].astype(str) + " (" + top['points'].map('{:g}'.format) + "pts)"
+    standings = lines.groupby([top['year'].to_numpy(), top['round'].to_numpy()], sort=True).agg('\n'.join)
+
+    # "Recent Champions:" lines per season, then the n_champions seasons before each year
+    champions = seasonal[seasonal['position'] == 1]
+    champion_lines = dict(zip(
+        champions['year'],
+        champions['year'].astype(str) + " Champion: " + champions['name'].astype(str)
+        + " (" + champions['points'].map('{:g}'.format) + "pts)",
+    ))
+    recent = {
+        year: "".join(champion_lines[y] + "\n" for y in range(year - n_champions, year) if y in champion_lines)
+        for year in years
+    }
+
+    # Final ranking in the same "N. Name (Xpts)" shape the model continues after "Final Result:"
+    final = seasonal[seasonal.groupby('year').cumcount() < RANKING_LINES]
+    final_lines = (final.groupby('year').cumcount() + 1).astype(str) + ". " + final['name'].astype(str) + " (" \
+        + final['points'].map('{:g}'.format) + "pts)\n"
+    answers = final_lines.groupby(final['year'].to_numpy()).agg(''.join)
+
+    index = standings.index
+    example_years = index.get_level_values(0)
+    example_rounds = index.get_level_values(1)
+    instruction = (
+        "F1 " + example_years.astype(str) + " Constructor Championship Prediction\n\nRecent Champions:\n"
+        + example_years.map(recent).fillna("") + "\nCurrent Standings After Round "
+        + example_rounds.astype(str) + ":\n" + standings.to_numpy() + "\n\nFinal Result:\n"
+    )
+    frame = pd.DataFrame({
+        "id": "round-" + example_years.astype(str) + "-" + example_rounds.astype(str),
+        "kind": "round",
+        "year": example_years.to_numpy(),
+        "round": example_rounds.to_numpy(),
+        "instruction": instruction.to_numpy(),
+        "response": example_years.map(answers).to_numpy(),
+    })
+    return frame[frame['response'].notna()]
+
+def eval_seasons(years, eval_fraction=0.1, seed=0):
+    """Deterministic set of eval seasons: the first round(eval_fraction * n) by hash, at least one.
+
+    Ranking by hash (stable across runs and machines) fixes the eval size,
+    where hashing each season into a bucket could leave eval empty.
+    """
+    years = sorted(set(int(year) for year in years))
+    if eval_fraction <= 0 or not years:
+        return set()
+    ranked = sorted(years, key=lambda year: hashlib.sha1(f"{seed}:{year}".encode()).hexdigest())
+    count = max(1, round(eval_fraction * len(years)))
+    # Keep at least one training season when there is more than one
+    return set(ranked[:min(count, max(1, len(years) - 1))])
+
+def iter_examples(min_year=MIN_YEAR, max_year=None, window=WINDOW, include_rounds=True, round_step=1,
+                  eval_fraction=0.1, seed=0, chunk_years=CHUNK_YEARS, data_dir=None):
+    """Yield DataFrames of examples, a chunk of seasons at a time.
+
+    Splits are assigned per season, so a season's round variants never land
+    on both sides of the split.
+    """
+    seasonal = get_cleaned_data(data_dir)
+    rounds = get_round_data(data_dir) if include_rounds else None
+    max_year = max_year or int(seasonal['year'].max())
+    all_years = list(range(min_year, max_year + 1))
+    # Seasons with a final ranking to answer with; the split is chosen over all of them at once
+    held_out = eval_seasons(seasonal.loc[seasonal['year'].isin(all_years), 'year'].unique(), eval_fraction, seed)
+    for start in range(0, len(all_years), chunk_years):
+        years = all_years[start:start + chunk_years]
+        frames = [season_examples(seasonal, years, window)]
+        if include_rounds:
+            frames.append(round_examples(seasonal, rounds, years, round_step=round_step))
+        chunk = pd.concat(frames, ignore_index=True)
+        if chunk.empty:
+            continue
+        chunk['split'] = chunk['year'].astype(int).isin(held_out).map({True: "eval", False: "train"})
+        # Same layout the guide's Cell 4 builds for training
+        chunk['text'] = "### Instruction:\n" + chunk['instruction'] + "\n\n### Response:\n" + chunk['response']
+        yield chunk
+
+class ShardWriter:
+    """Streams example chunks into numbered JSONL or Arrow files per split."""
+
+    def __init__(self, out_dir, shard_size=SHARD_SIZE, fmt="jsonl"):
+        if fmt == "arrow":
+            # Fail before writing anything if Arrow output is unavailable
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("Arrow output needs pyarrow: pip install pyarrow") from None
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.fmt = fmt
+        self.pending = {}
+        self.shards = []
+        self.counts = {}
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, chunk):
+        for split, rows in chunk.groupby('split', sort=True):
+            buffer = pd.concat([self.pending[split], rows]) if split in self.pending else rows
+            while len(buffer) >= self.shard_size:
+                self._flush(split, buffer.iloc[:self.shard_size])
+                buffer = buffer.iloc[self.shard_size:]
+            self.pending[split] = buffer
+
+    def _flush(self, split, rows):
+        number = sum(1 for shard in self.shards if shard["split"] == split)
+        path = os.path.join(self.out_dir, f"{split}-{number:05d}.{self.fmt}")
+        rows = rows.drop(columns='split')
+        if self.fmt == "arrow":
+            import pyarrow as pa
+            import pyarrow.feather as feather
+
+            feather.write_feather(pa.Table.from_pandas(rows, preserve_index=False), path)
+        else:
+            rows.to_json(path, orient='records', lines=True, force_ascii=False)
+        self.shards.append({"split": split, "path": os.path.basename(path), "examples": len(rows)})
+        self.counts[split] = self.counts.get(split, 0) + len(rows)
+
+    def close(self, params=None):
+        """Write the remaining rows and a manifest.json describing the shards."""
+        for split, rows in self.pending.items():
+            if len(rows):
+                self._flush(split, rows)
+        self.pending = {}
+        manifest = {"format": self.fmt, "counts": self.counts, "shards": self.shards, "params": params or {}}
+        with open(os.path.join(self.out_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+def build_dataset(out_dir, fmt="jsonl", shard_size=SHARD_SIZE, **params):
+    """Generate every example and stream it into shards under out_dir; returns the manifest."""
+    writer = ShardWriter(out_dir, shard_size, fmt)
+    for chunk in iter_examples(**params):
+        writer.write(chunk)
+    manifest = writer.close(params)
+    if params.get("eval_fraction", 0.1) > 0 and not manifest["counts"].get("eval"):
+        raise ValueError(f"No eval examples were generated; widen the year range ({manifest['counts']})")
+    return manifest
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the fine-tuning dataset as sharded JSONL or Arrow files.")
+    parser.add_argument("--out", default="finetune_data", help="Output directory")
+    parser.add_argument("--format", choices=["jsonl", "arrow"], default="jsonl")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--min-year", type=int, default=MIN_YEAR)
+    parser.add_argument("--max-year", type=int)
+    parser.add_argument("--window", type=int, default=WINDOW, help="Seasons of history per season example")
+    parser.add_argument("--no-rounds", action="store_true", help="Only season examples, no after-round variants")
+    parser.add_argument("--round-step", type=int, default=1, help="Use every Nth round for round variants")
+    parser.add_argument("--eval-fraction", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0, help="Changes which seasons go to eval")
+    parser.add_argument("--data-dir", help="Data directory (default: the active dataset version)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    start = time.perf_counter()
+    manifest = build_dataset(
+        args.out, args.format, args.shard_size,
+        min_year=args.min_year, max_year=args.max_year, window=args.window, include_rounds=not args.no_rounds,
+        round_step=args.round_step, eval_fraction=args.eval_fraction, seed=args.seed, data_dir=args.data_dir,
+    )
+    print(f"Wrote {sum(manifest['counts'].values())} examples ({manifest['counts']}) "
+          f"in {len(manifest['shards'])} shards to {args.out} in {time.perf_counter() - start:.2f}s")
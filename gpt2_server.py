@@ -0,0 +1,257 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from standings_parser import RANKING_LINES, count_complete_ranking_lines, extract_ranking
+
+MODEL_NAME = "Rave271/f1-gpt2-finetuned"
+
+# Sampling settings tuned for the fine-tuned model
+GENERATION_KWARGS = {
+    "max_new_tokens": 120,
+    "temperature": 0.25,              # Lower = more stable
+    "top_k": 20,
+    "top_p": 0.9,
+    "repetition_penalty": 1.2,
+    "no_repeat_ngram_size": 3,        # Prevent copying
+    "do_sample": True,
+}
+
+def anchor_prompt(prompt):
+    """Make the prompt end with "\\n1." so the model starts the ranking straight away."""
+    prompt = prompt.rstrip()
+    if not prompt.endswith("1."):
+        prompt = prompt + "\n1."
+    return prompt
+
+def _conv1d_to_linear(model):
+    """Swap GPT-2's Conv1D layers for nn.Linear so dynamic quantization applies to them."""
+    import torch
+    from transformers.pytorch_utils import Conv1D
+
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                # Conv1D stores its weight as (in_features, out_features)
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features)
+                linear.weight.data = child.weight.data.t().contiguous()
+                linear.bias.data = child.bias.data
+                setattr(parent, name, linear)
+    return model
+
+class _Request:
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.n_tokens = None
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+class GPT2InferenceServer:
+    """Micro-batching CPU inference service for the fine-tuned GPT-2 model.
+
+    Concurrent generate() calls are collected for up to max_wait_ms and run
+    together in one model.generate call. Each collected batch is split so that
+    prompts of very different lengths are not padded to each other. Generation
+    stops for each sequence as soon as its ranking is complete.
+
+    The tokenizer is only used from the worker thread: a fast tokenizer is not
+    safe to share between threads, and padding changes its state.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, max_batch_size=8, max_wait_ms=10, max_padding_ratio=0.25,
+                 num_threads=None, quantize=True, compile_model=False, device=None):
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_padding_ratio = max_padding_ratio
+        self.num_threads = num_threads or os.cpu_count()
+        self.quantize = quantize
+        self.compile_model = compile_model
+        self.device = device
+        self.tokenizer = None
+        self.model = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self.state = "idle"
+        self.load_seconds = None
+        self.error = None
+        self.batches = 0
+        self.requests = 0
+        self.generated_tokens = 0
+
+    def _load(self):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        torch.set_num_threads(self.num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Can only be set before any parallel work has run
+
+        if self.device is None:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # GPT-2 pad fix; pad on the left so every prompt ends where generation starts
+        tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+
+        model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        model.config.pad_token_id = tokenizer.eos_token_id
+        model.eval()
+        if self.device == "cpu" and self.quantize:
+            model = torch.ao.quantization.quantize_dynamic(
+                _conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8
+            )
+        model.to(self.device)
+        if self.compile_model:
+            model.forward = torch.compile(model.forward)
+
+        self.tokenizer = tokenizer
+        self.model = model
+
+    def start(self):
+        """Load the model and start the batching worker (idempotent)."""
+        with self._start_lock:
+            if self._thread is None:
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    self._load()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self._thread = threading.Thread(target=self._worker, name="gpt2-inference", daemon=True)
+                self._thread.start()
+                self.state = "ready"
+                self.error = None
+                self._loaded.set()
+        return self
+
+    def start_background(self):
+        """Start loading in a background thread so the caller can serve immediately."""
+        thread = threading.Thread(target=self._start_quietly, name="gpt2-load", daemon=True)
+        thread.start()
+        return thread
+
+    def _start_quietly(self):
+        try:
+            self.start()
+        except Exception:
+            pass  # Recorded in state/error; the next request retries the load
+
+    def is_ready(self):
+        return self._loaded.is_set()
+
+    def submit(self, prompt):
+        """Queue a prompt and return a Future of its ranking text."""
+        self.start()
+        request = _Request(anchor_prompt(prompt))
+        self._queue.put(request)
+        return request.future
+
+    def generate(self, prompt, timeout=None):
+        """Generate the predicted ranking for a prompt."""
+        return self.submit(prompt).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _split_by_length(self, batch):
+        """Group requests of similar length so padding stays under max_padding_ratio."""
+        groups, current = [], []
+        for request in sorted(batch, key=lambda r: r.n_tokens):
+            candidate = current + [request]
+            padded = len(candidate) * candidate[-1].n_tokens
+            real = sum(r.n_tokens for r in candidate)
+            if current and (padded - real) / padded > self.max_padding_ratio:
+                groups.append(current)
+                candidate = [request]
+            current = candidate
+        if current:
+            groups.append(current)
+        return groups
+
+    def _run(self, requests):
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        tokenizer = self.tokenizer
+        inputs = tokenizer([r.prompt for r in requests], return_tensors="pt", padding=True).to(self.device)
+        prompt_length = inputs["input_ids"].shape[1]
+
+        class RankingComplete(StoppingCriteria):
+            """Per-sequence stop once the ranking has RANKING_LINES complete lines."""
+
+            def __call__(self, input_ids, scores, **kwargs):
+                texts = tokenizer.batch_decode(input_ids[:, prompt_length:], skip_special_tokens=True)
+                done = [count_complete_ranking_lines("1." + text) >= RANKING_LINES for text in texts]
+                return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+        with torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                **GENERATION_KWARGS,
+                pad_token_id=tokenizer.eos_token_id,
+                stopping_criteria=StoppingCriteriaList([RankingComplete()]),
+            )
+
+        generated = outputs[:, prompt_length:]
+        self.generated_tokens += int((generated != tokenizer.eos_token_id).sum())
+        texts = tokenizer.batch_decode(generated, skip_special_tokens=True)
+        # The anchor "1." is the end of the prompt, so the first ranking line starts there
+        return [extract_ranking("1." + text) for text in texts]
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                # Prompt lengths for grouping, in one unpadded call on this thread
+                lengths = self.tokenizer([r.prompt for r in batch])["input_ids"]
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, input_ids in zip(batch, lengths):
+                request.n_tokens = len(input_ids)
+            for group in self._split_by_length(batch):
+                try:
+                    results = self._run(group)
+                except Exception as e:
+                    for request in group:
+                        request.future.set_exception(e)
+                else:
+                    for request, result in zip(group, results):
+                        request.future.set_result(result)
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "generated_tokens": self.generated_tokens,
+            "queue_depth": self._queue.qsize(),
+        }
@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_PORT = 11434
+
+def _base_url():
+    """Server URL from OLLAMA_URL, or else OLLAMA_HOST as the ollama CLI reads it.
+
+    OLLAMA_HOST is usually set without a scheme ("0.0.0.0:11434", "gpu-box"); such
+    values get http:// and, if they have none, the default port.
+    """
+    url = os.environ.get("OLLAMA_URL") or os.environ.get("OLLAMA_HOST") or "localhost"
+    if "://" in url:
+        return url
+    host, slash, path = url.partition("/")
+    # The part after an IPv6 literal's "]" holds the port, if any
+    if ":" not in host.rsplit("]", 1)[-1]:
+        host = f"{host}:{DEFAULT_PORT}"
+    return f"http://{host}{slash}{path}"
+
+OLLAMA_URL = _base_url()
+
+class OllamaError(RuntimeError):
+    """An error Ollama reported in its response body, e.g. one that aborted a stream."""
+
+# Fail fast if Ollama is down, but give generation plenty of time
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 120
+
+# How long Ollama keeps the model loaded after a request
+DEFAULT_KEEP_ALIVE = "30m"
+
+class OllamaClient:
+    """Ollama HTTP client with a pooled keep-alive session and bounded retries."""
+
+    def __init__(self, base_url=OLLAMA_URL, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=3, backoff_factor=0.5, pool_size=10, keep_alive=DEFAULT_KEEP_ALIVE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+
+        # Retry connection failures and overload responses. Reads are not retried:
+        # a generation that timed out mid-way would just run again from scratch.
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, model, prompt, options, keep_alive, stream, extra):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": options or {},
+            "keep_alive": self.keep_alive if keep_alive is None else keep_alive,
+        }
+        payload.update(extra)
+        return payload
+
+    def generate(self, model, prompt, options=None, keep_alive=None, **extra):
+        """Call /api/generate without streaming and return the decoded JSON response."""
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json=self._payload(model, prompt, options, keep_alive, False, extra),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        result = response.json()
+        if "error" in result:
+            raise OllamaError(result["error"])
+        return result
+
+    def generate_stream(self, model, prompt, options=None, keep_alive=None, **extra):
+        """Call /api/generate with streaming, yielding each decoded JSON chunk.
+
+        The last chunk has "done": true and carries the timing stats. Closing the
+        generator early closes the connection, which stops generation in Ollama.
+        A chunk with an "error" key (e.g. the model crashed mid-generation)
+        raises OllamaError, so a truncated answer is never taken as complete.
+        """
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json=self._payload(model, prompt, options, keep_alive, True, extra),
+            timeout=self.timeout,
+            stream=True,
+        )
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise OllamaError(chunk["error"])
+                    yield chunk
+        finally:
+            response.close()
+
+    def load_model(self, model, keep_alive=None):
+        """Load a model into memory without generating (an empty prompt only loads it)."""
+        return self.generate(model, "", keep_alive=keep_alive)
+
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Get the shared process-wide Ollama client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+def set_client(client):
+    """Replace the shared client, e.g. to point at another server; returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
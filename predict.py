@@ -1,115 +1,300 @@
+import re
+import sys
+import time
+
 import requests
+from context_builder import CONTEXT_TOKEN_BUDGET, build_context
 from data_cleaning import get_seasonal_data, format_historical_data
+from ollama_client import get_client
+from prediction_cache import DETERMINISTIC_SEED, get_cache, make_key
+from standings_parser import RANKING_LINES, RankingStopper, answer_token_limit, parse_standings
+from tracing import finish_span, record_ollama_stats, span, start_span
 
-def predict_season(historical_data, target_year=2024, model="llama3:8b", temperature=0.8):
-    """Use Llama 3 via Ollama to predict constructor standings."""
-    prompt = f"""Based on the following F1 constructor standings, predict the {target_year} season.
+# Timing and token counts Ollama reports in the final response chunk
+STAT_FIELDS = (
+    "total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+    "eval_count", "eval_duration",
+)
+
+# The prompts ask for a ranked list plus a 2-sentence summary; stop generating after that
+SUMMARY_SENTENCES = 2
+
+# Ollama ends generation itself (and sends its final stats) at this many tokens or at a stop sequence
+ANSWER_TOKENS = answer_token_limit(RANKING_LINES, SUMMARY_SENTENCES)
+STOP_SEQUENCES = ["\n\n\n", "\nNote:", "\n**Note", "\n(Note", "\nDisclaimer"]
 
-{historical_data}
+_YEAR = re.compile(r"\b(?:19[5-9]\d|20\d\d)\b")
+
+# Fixed instructions shared by both prompts. They come before any variable data, so
+# Ollama can reuse the evaluated prefix instead of re-reading it on every request.
+PROMPT_PREFIX = """You are an F1 expert. You predict the Formula 1 Constructor Championship from the historical constructor standings given below.
 
 Give ONLY:
-1. A ranked list of teams with predicted points (1 line per team)
-2. A 2-sentence summary
+1. A ranked list of all teams with predicted points (1 line per team)
+2. A 2-sentence summary explaining your prediction
+
+"""
+
+def build_season_prompt(historical_data, target_year=2024):
+    """Build the legacy-mode prompt from formatted historical data."""
+    return f"""{PROMPT_PREFIX}HISTORICAL STANDINGS:
+{historical_data.rstrip()}
+
+Predict the {target_year} season.
 
 {target_year} Predicted Standings:"""
 
-    try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": 300
-                }
-            },
-            timeout=120
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result.get("response", "No response received")
-    except requests.exceptions.ConnectionError:
+def build_rag_prompt(context, target_year=2024):
+    """Build the RAG prompt from retrieved context."""
+    return f"""{PROMPT_PREFIX}RETRIEVED CONTEXT:
+{context}
+
+Predict the {target_year} season.
+
+{target_year} Predicted Standings:"""
+
+def get_rag_context(query, target_year=2024, n_recent_years=4, budget=CONTEXT_TOKEN_BUDGET):
+    """Retrieve the RAG context for a prediction as a compact table within budget tokens.
+
+    Results for a custom query are added unless the table already holds them
+    (see context_builder.build_context).
+    """
+    return build_context(target_year, n_recent_years, query, budget)
+
+def _error_message(e):
+    """User-facing message for a failed Ollama call."""
+    if isinstance(e, requests.exceptions.ConnectionError):
         return "Error: Cannot connect to Ollama. Make sure Ollama is running (ollama serve)."
-    except requests.exceptions.Timeout:
+    if isinstance(e, requests.exceptions.Timeout):
         return "Error: Request timed out. The model might be loading or too slow."
-    except Exception as e:
-        return f"Error: {str(e)}"
+    return f"Error: {str(e)}"
 
-def predict_with_rag(query, target_year=2024, model="llama3:8b", temperature=0.8):
-    """Use RAG to get context and predict with Llama 3."""
-    from vector_store import get_context_for_prediction, query_similar
-    
-    # Get relevant context from vector store
-    context = get_context_for_prediction(target_year)
-    
-    # Also query for specific patterns if user has a query
-    if query:
-        specific_results = query_similar(query, n_results=5)
-        extra_context = "\n".join(specific_results['documents'][0])
-        context = f"{context}\n\nAdditional relevant info:\n{extra_context}"
-    
-    prompt = f"""You are an F1 expert. Using the following historical data retrieved from our database, predict the {target_year} F1 Constructor Championship.
-
-RETRIEVED CONTEXT:
-{context}
+def _options(temperature, num_predict, deterministic=False):
+    """Ollama sampling options; deterministic mode pins the seed so results are reusable.
 
-Based on this data, predict the {target_year} season standings.
+    num_predict is capped at ANSWER_TOKENS, and the notes models add after the
+    answer are stop sequences.
+    """
+    options = {"temperature": temperature, "num_predict": min(num_predict, ANSWER_TOKENS), "stop": STOP_SEQUENCES}
+    if deterministic:
+        options["seed"] = DETERMINISTIC_SEED
+    return options
 
-Give ONLY:
-1. A ranked list of all 10 teams with predicted points (1 line per team)
-2. A 2-sentence summary explaining your prediction
+def _stream_tokens(prompt, model, options, stats):
+    """Yield response tokens until Ollama ends the generation.
 
-{target_year} Predicted Standings:"""
+    The options' token cap and stop sequences normally end it right after the
+    answer, and Ollama's final stats (and done_reason) land in stats. As a
+    backstop, the stream is closed once the ranking and summary are complete,
+    which also stops decoding; Ollama sends no stats then and
+    stats["stopped_early"] is set instead.
+    """
+    stopper = RankingStopper(summary_sentences=SUMMARY_SENTENCES)
+    llm_span = start_span("llm.generate", model=model, prompt_chars=len(prompt))
+    timings = {"token_count": 0}
+    begin = time.perf_counter()
+    try:
+        stream = get_client().generate_stream(model, prompt, options=options)
+        try:
+            for chunk in stream:
+                if chunk.get("done"):
+                    stats.update({k: chunk[k] for k in STAT_FIELDS + ("done_reason",) if k in chunk})
+                token = chunk.get("response", "")
+                if token:
+                    if not timings["token_count"]:
+                        timings["time_to_first_token"] = time.perf_counter() - begin
+                    timings["token_count"] += 1
+                    yield token
+                    if stopper.feed(token):
+                        stats["stopped_early"] = True
+                        break
+        finally:
+            stream.close()
+    finally:
+        # Split the call into Ollama's load / prompt-eval / decode stages
+        timings["elapsed"] = time.perf_counter() - begin
+        llm_span.attrs.update(tokens=timings["token_count"], stopped_early=stats.get("stopped_early", False))
+        record_ollama_stats({**stats, **timings}, llm_span, llm_span.start)
+        finish_span(llm_span)
+
+def _prompt_years(prompt):
+    """Seasons mentioned in a prompt: its answer depends on at most these seasons' data."""
+    return {int(year) for year in _YEAR.findall(prompt)}
+
+def _cache_lookup(key):
+    with span("prediction_cache.get") as current:
+        cached = get_cache().get(key)
+        current.attrs["hit"] = cached is not None
+        return cached
+
+def _generate(prompt, model, options, use_cache=True):
+    """Run a generation, serving repeated prompts from the prediction cache."""
+    key = make_key(prompt, model, options)
+    if use_cache:
+        cached = _cache_lookup(key)
+        if cached is not None:
+            return cached
+
+    response = "".join(_stream_tokens(prompt, model, options, {}))
+    if not response:
+        return "No response received"
+    if use_cache:
+        get_cache().put(key, model, response, _prompt_years(prompt))
+    return response
+
+def run_prompt(prompt, model="llama3:8b", temperature=0.8, num_predict=300, use_cache=True, deterministic=False):
+    """Generate a response for an already assembled prompt; Ollama errors are raised."""
+    return _generate(prompt, model, _options(temperature, num_predict, deterministic), use_cache)
+
+class PredictionStream:
+    """Iterable of generated text chunks from Ollama.
+
+    Once iteration finishes, text holds the full response and stats holds
+    Ollama's timings and token counts plus the measured time to first token.
+    A cached response is yielded as a single chunk with stats["cached"] set.
+    Generation stops as soon as the ranking and its summary are complete, and
+    standings holds the parsed ranking.
+    """
+
+    def __init__(self, prompt, model, options, context="", use_cache=True):
+        self.prompt = prompt
+        self.model = model
+        self.options = options
+        self.context = context
+        self.use_cache = use_cache
+        self.text = ""
+        self.stats = {}
+        self.error = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        key = make_key(self.prompt, self.model, self.options)
+        if self.use_cache:
+            cached = _cache_lookup(key)
+            if cached is not None:
+                self.text = cached
+                self.stats = {"cached": True, "elapsed": time.perf_counter() - start}
+                yield cached
+                return
+
+        chunks = []
+        try:
+            for token in _stream_tokens(self.prompt, self.model, self.options, self.stats):
+                if not chunks:
+                    self.stats["time_to_first_token"] = time.perf_counter() - start
+                chunks.append(token)
+                yield token
+        except Exception as e:
+            self.error = _error_message(e)
+            chunks.append(self.error)
+            yield self.error
+        finally:
+            self.stats["elapsed"] = time.perf_counter() - start
+            self.text = "".join(chunks) or "No response received"
+            if "stopped_early" in self.stats:
+                self.stats["token_count"] = len(chunks)
+        if self.use_cache and chunks and self.error is None:
+            get_cache().put(key, self.model, self.text, _prompt_years(self.prompt))
+
+    @property
+    def standings(self):
+        """The response parsed into ParsedStandings (see standings_parser)."""
+        return parse_standings(self.text)
+
+def predict_season(historical_data, target_year=2024, model="llama3:8b", temperature=0.8,
+                   use_cache=True, deterministic=False):
+    """Use Llama 3 via Ollama to predict constructor standings."""
+    prompt = build_season_prompt(historical_data, target_year)
 
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": temperature,
-                    "num_predict": 400
-                }
-            },
-            timeout=120
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result.get("response", "No response received"), context
-    except requests.exceptions.ConnectionError:
-        return "Error: Cannot connect to Ollama. Make sure Ollama is running (ollama serve).", ""
-    except requests.exceptions.Timeout:
-        return "Error: Request timed out. The model might be loading or too slow.", ""
+        return _generate(prompt, model, _options(temperature, 300, deterministic), use_cache)
     except Exception as e:
-        return f"Error: {str(e)}", ""
+        return _error_message(e)
+
+def stream_season(historical_data, target_year=2024, model="llama3:8b", temperature=0.8,
+                  use_cache=True, deterministic=False):
+    """Streaming variant of predict_season."""
+    prompt = build_season_prompt(historical_data, target_year)
+    return PredictionStream(prompt, model, _options(temperature, 300, deterministic), use_cache=use_cache)
 
-def get_prediction(start_year=2020, end_year=2023, target_year=2024, temperature=0.8):
+def predict_with_rag(query, target_year=2024, model="llama3:8b", temperature=0.8,
+                     use_cache=True, deterministic=False):
+    """Use RAG to get context and predict with Llama 3."""
+    with span("prompt_assembly", mode="rag"):
+        context = get_rag_context(query, target_year)
+        prompt = build_rag_prompt(context, target_year)
+
+    try:
+        return _generate(prompt, model, _options(temperature, 400, deterministic), use_cache), context
+    except Exception as e:
+        return _error_message(e), ""
+
+def stream_with_rag(query, target_year=2024, model="llama3:8b", temperature=0.8,
+                    use_cache=True, deterministic=False):
+    """Streaming variant of predict_with_rag; the context is on the returned stream."""
+    with span("prompt_assembly", mode="rag"):
+        context = get_rag_context(query, target_year)
+        prompt = build_rag_prompt(context, target_year)
+    return PredictionStream(prompt, model, _options(temperature, 400, deterministic),
+                            context=context, use_cache=use_cache)
+
+def get_prediction(start_year=2020, end_year=2023, target_year=2024, temperature=0.8,
+                   use_cache=True, deterministic=False):
     """Get F1 constructor championship prediction (legacy method)."""
-    seasonal = get_seasonal_data(start_year, end_year)
-    historical_data = format_historical_data(seasonal, start_year, end_year)
-    prediction = predict_season(historical_data, target_year, temperature=temperature)
+    with span("prompt_assembly", mode="legacy"):
+        seasonal = get_seasonal_data(start_year, end_year)
+        historical_data = format_historical_data(seasonal, start_year, end_year)
+    prediction = predict_season(historical_data, target_year, temperature=temperature,
+                                use_cache=use_cache, deterministic=deterministic)
     return prediction, historical_data
 
-def get_rag_prediction(query="", target_year=2024, temperature=0.8):
+def get_prediction_stream(start_year=2020, end_year=2023, target_year=2024, temperature=0.8,
+                          use_cache=True, deterministic=False):
+    """Streaming variant of get_prediction; the historical data is the stream's context."""
+    with span("prompt_assembly", mode="legacy"):
+        seasonal = get_seasonal_data(start_year, end_year)
+        historical_data = format_historical_data(seasonal, start_year, end_year)
+    stream = stream_season(historical_data, target_year, temperature=temperature,
+                           use_cache=use_cache, deterministic=deterministic)
+    stream.context = historical_data
+    return stream
+
+def get_baseline_prediction(start_year=2020, end_year=2023, target_year=2024):
+    """Get an instant statistical baseline prediction (no LLM); returns (prediction, standings)."""
+    from baseline import format_prediction, predict_standings
+
+    seasonal = get_seasonal_data(start_year, end_year)
+    standings = predict_standings(seasonal, target_year, n_recent_years=target_year - start_year)
+    return format_prediction(standings, target_year), standings
+
+def get_rag_prediction(query="", target_year=2024, temperature=0.8, use_cache=True, deterministic=False):
     """Get F1 constructor championship prediction using RAG."""
-    prediction, context = predict_with_rag(query, target_year, temperature=temperature)
+    prediction, context = predict_with_rag(query, target_year, temperature=temperature,
+                                           use_cache=use_cache, deterministic=deterministic)
     return prediction, context
 
+def get_rag_prediction_stream(query="", target_year=2024, temperature=0.8, use_cache=True, deterministic=False):
+    """Streaming variant of get_rag_prediction."""
+    return stream_with_rag(query, target_year, temperature=temperature,
+                           use_cache=use_cache, deterministic=deterministic)
+
 if __name__ == "__main__":
+    if "--baseline" in sys.argv[1:]:
+        prediction, _ = get_baseline_prediction()
+        print("Baseline prediction for 2024:")
+        print(prediction)
+        sys.exit(0)
+
     print("=" * 50)
     print("Testing RAG-based prediction...")
     print("=" * 50)
-    
+
     prediction, context = get_rag_prediction(target_year=2024)
-    
+
     print("\nRetrieved Context (from vector DB):")
     print("-" * 40)
     print(context[:1000] + "..." if len(context) > 1000 else context)
-    
+
     print("\n" + "=" * 50)
     print("Prediction for 2024:")
     print("=" * 50)
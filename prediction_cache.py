@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), "cache", "predictions.sqlite3")
+
+# Cached predictions expire after a day and at most this many are kept
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 1000
+
+# Pending last_used updates at which a lookup writes them out itself
+TOUCH_FLUSH_SIZE = 64
+
+# Seed sent to Ollama in deterministic mode, so a cached answer is exactly what a rerun would produce
+DETERMINISTIC_SEED = 42
+
+def make_key(prompt, model, options):
+    """Cache key for a fully assembled prompt, model and sampling options."""
+    payload = json.dumps({"prompt": prompt, "model": model, "options": options or {}}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class PredictionCache:
+    """SQLite-backed cache of LLM responses with TTL and LRU size bounding.
+
+    Hits do not write: their last_used times are buffered and written with
+    the next put (before it evicts), on close, or once TOUCH_FLUSH_SIZE keys
+    are pending.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)")
+        # Seasons whose data each cached prompt contains, for targeted invalidation
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_years (key TEXT, year INTEGER, PRIMARY KEY (key, year))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS prediction_years_year ON prediction_years (year)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached response for key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._conn.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+            return response
+
+    def _flush_touched(self):
+        # Caller holds the lock and commits
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE predictions SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put(self, key, model, response, years=None):
+        """Store a response, then drop expired entries and the least recently used over the limit.
+
+        years are the seasons whose data the prompt contains; invalidate_years
+        drops the response when any of them changes.
+        """
+        now = time.time()
+        with self._lock:
+            self._flush_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions (key, model, response, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self._conn.execute("DELETE FROM prediction_years WHERE key = ?", (key,))
+            self._conn.executemany(
+                "INSERT INTO prediction_years (key, year) VALUES (?, ?)",
+                [(key, int(year)) for year in sorted(set(years or ()))],
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM predictions WHERE created < ?", (now - self.ttl,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM predictions WHERE key IN "
+                    "(SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.execute("DELETE FROM prediction_years WHERE key NOT IN (SELECT key FROM predictions)")
+            self._conn.commit()
+
+    def invalidate_years(self, years):
+        """Drop every response whose prompt contains data from one of years; returns how many."""
+        years = [int(year) for year in years]
+        if not years:
+            return 0
+        marks = ", ".join("?" * len(years))
+        with self._lock:
+            dropped = self._conn.execute(
+                f"DELETE FROM predictions WHERE key IN (SELECT key FROM prediction_years WHERE year IN ({marks}))",
+                years,
+            ).rowcount
+            self._conn.execute("DELETE FROM prediction_years WHERE key NOT IN (SELECT key FROM predictions)")
+            self._conn.commit()
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM predictions")
+            self._conn.execute("DELETE FROM prediction_years")
+            self._conn.commit()
+
+    def close(self):
+        """Write the buffered last_used times and close the database."""
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Get the shared process-wide prediction cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache()
+        return _cache
@@ -0,0 +1,107 @@
+import bisect
+import threading
+from collections import namedtuple
+
+from data_cleaning import get_cleaned_data, get_round_data
+
+RoundStanding = namedtuple('RoundStanding', ['constructorId', 'name', 'points', 'position', 'wins'])
+
+class RoundStandingsIndex:
+    """Standings after each round, keyed by (year, round) and (year, round, constructorId).
+
+    standings_after(year, round) is a dict lookup plus a bisect, so mid-season
+    context never rescans the standings table.
+    """
+
+    def __init__(self):
+        self._standings = {}
+        self._by_constructor = {}
+        self._rounds = {}
+
+    @classmethod
+    def from_frame(cls, rounds):
+        """Build the index from round-level data (see data_cleaning.clean_round_data)."""
+        index = cls()
+        columns = [rounds[c].tolist() for c in ('year', 'round', 'constructorId', 'name', 'points', 'position', 'wins')]
+        grouped = {}
+        for year, rnd, constructor_id, name, points, position, wins in zip(*columns):
+            grouped.setdefault((year, rnd), []).append(RoundStanding(constructor_id, name, points, position, wins))
+        for (year, rnd), rows in grouped.items():
+            index.append_round(year, rnd, rows)
+        return index
+
+    def append_round(self, year, rnd, rows):
+        """Add (or replace) the standings after one round as new results arrive."""
+        rows = sorted((RoundStanding(*row) for row in rows), key=lambda row: row.position)
+        key = (year, rnd)
+        if key not in self._standings:
+            bisect.insort(self._rounds.setdefault(year, []), rnd)
+        self._standings[key] = rows
+        self._by_constructor[key] = {row.constructorId: row for row in rows}
+
+    def rounds(self, year):
+        """Rounds of a season with standings, in order."""
+        return list(self._rounds.get(year, []))
+
+    def latest_round(self, year):
+        """Last round of a season with standings, or None."""
+        rounds = self._rounds.get(year)
+        return rounds[-1] if rounds else None
+
+    def _resolve(self, year, rnd):
+        rounds = self._rounds.get(year)
+        if not rounds:
+            return None
+        if rnd is None:
+            return rounds[-1]
+        # Latest round at or before rnd
+        i = bisect.bisect_right(rounds, rnd)
+        return rounds[i - 1] if i else None
+
+    def standings_after(self, year, rnd=None):
+        """Standings after round rnd of year (or the latest round at or before it), best first."""
+        resolved = self._resolve(year, rnd)
+        return [] if resolved is None else self._standings[(year, resolved)]
+
+    def get(self, year, rnd, constructor_id):
+        """A single constructor's standing after round rnd of year, or None."""
+        resolved = self._resolve(year, rnd)
+        return None if resolved is None else self._by_constructor[(year, resolved)].get(constructor_id)
+
+    def format_standings(self, year, rnd=None, top_n=None):
+        """Render standings after a round in the "Current Standings After Round R" prompt format."""
+        resolved = self._resolve(year, rnd)
+        if resolved is None:
+            return ""
+        rows = self._standings[(year, resolved)][:top_n]
+        lines = [f"Current Standings After Round {resolved}:"]
+        lines += [f"{row.position}. {row.name} ({row.points:g}pts)" for row in rows]
+        return "\n".join(lines)
+
+_INDEX = {"rounds": None, "index": None}
+_INDEX_LOCK = threading.Lock()
+
+def get_round_index(data_dir=None):
+    """Get the round index, rebuilding it only when the round data was reloaded."""
+    rounds = get_round_data(data_dir)
+    with _INDEX_LOCK:
+        if _INDEX["rounds"] is not rounds:
+            _INDEX["index"] = RoundStandingsIndex.from_frame(rounds)
+            _INDEX["rounds"] = rounds
+        return _INDEX["index"]
+
+def build_midseason_prompt(year, rnd, n_champions=3, top_n=3, data_dir=None):
+    """Build the mid-season prompt used by the fine-tuned GPT-2 model from indexed standings."""
+    seasonal = get_cleaned_data(data_dir)
+    champions = seasonal[(seasonal['year'] < year) & (seasonal['year'] >= year - n_champions)]
+    champions = champions[champions['position'] == 1]
+    lines = [f"F1 {year} Constructor Championship Prediction", "", "Recent Champions:"]
+    lines += [
+        f"{year_} Champion: {name} ({points:g}pts)"
+        for year_, name, points in zip(champions['year'], champions['name'], champions['points'])
+    ]
+    lines += ["", get_round_index(data_dir).format_standings(year, rnd, top_n), "", "Final Result:", ""]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    print(build_midseason_prompt(2024, 15))
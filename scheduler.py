@@ -0,0 +1,382 @@
+import asyncio
+import contextvars
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import predict
+
+# Concurrent LLM generations allowed at once; more requests wait in the queue
+DEFAULT_CONCURRENCY = int(os.environ.get("F1_LLM_CONCURRENCY", 2))
+
+# Priorities: lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Streaming prediction functions, by name (see stream_prediction)
+STREAMERS = {
+    "legacy": predict.get_prediction_stream,
+    "rag": predict.get_rag_prediction_stream,
+}
+
+def _run_stream(stream_id):
+    return _SharedStream.get(stream_id).produce()
+
+# Prediction functions the scheduler can run, by name
+PREDICTORS = {
+    "legacy": predict.get_prediction,
+    "rag": predict.get_rag_prediction,
+    "prompt": predict.run_prompt,
+    "stream": _run_stream,
+}
+
+def request_key(kind, kwargs):
+    """Key identifying identical requests, used to coalesce them."""
+    payload = json.dumps({"kind": kind, "kwargs": kwargs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class _Job:
+    def __init__(self, key, kind, kwargs, priority, future, context):
+        self.key = key
+        self.kind = kind
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = future
+        self.context = context
+        self.waiters = 1
+        self.enqueued = time.perf_counter()
+        self.started = False
+
+class PredictionScheduler:
+    """Asyncio scheduler in front of the prediction functions.
+
+    Runs at most `concurrency` predictions at once, in priority order.
+    Identical in-flight requests share one execution. A queued job whose
+    callers have all gone away is dropped before it starts. A job runs in
+    the context of the caller that created it, so its spans nest under that
+    caller's current span.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, predictors=None):
+        self.concurrency = concurrency
+        self.predictors = predictors or PREDICTORS
+        self._queue = None
+        self._workers = []
+        self._inflight = {}
+        self._counter = itertools.count()
+        self._waits = deque(maxlen=1000)
+        self.completed = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def submit(self, kind, priority=PRIORITY_INTERACTIVE, context=None, **kwargs):
+        """Run predictor `kind` with kwargs and return its result.
+
+        context is the contextvars.Context to run it in (default: the caller's).
+        """
+        self._ensure_started()
+        key = request_key(kind, kwargs)
+        job = self._inflight.get(key)
+        if job is not None:
+            job.waiters += 1
+            self.coalesced += 1
+            # A more urgent duplicate promotes the shared job
+            if priority < job.priority and not job.started:
+                job.priority = priority
+                self._queue.put_nowait((priority, next(self._counter), job))
+        else:
+            job = _Job(key, kind, kwargs, priority, asyncio.get_running_loop().create_future(),
+                       context or contextvars.copy_context())
+            self._inflight[key] = job
+            self._queue.put_nowait((priority, next(self._counter), job))
+
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            job.waiters -= 1
+            if job.waiters == 0 and not job.started:
+                self._drop(job)
+            raise
+
+    def _drop(self, job):
+        self._inflight.pop(job.key, None)
+        if not job.future.done():
+            job.future.cancel()
+        self.cancelled += 1
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                # Skip stale queue entries (cancelled, or re-queued at a higher priority)
+                if job.started or job.future.done():
+                    continue
+                job.started = True
+                self._waits.append(time.perf_counter() - job.enqueued)
+                try:
+                    result = await loop.run_in_executor(
+                        None, lambda: job.context.run(self.predictors[job.kind], **job.kwargs)
+                    )
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+                    self.completed += 1
+                finally:
+                    self._inflight.pop(job.key, None)
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        """Stop the workers; queued jobs are cancelled."""
+        for job in list(self._inflight.values()):
+            self._drop(job)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._queue = None
+        self._workers = []
+
+    def stats(self):
+        """Queue depth, in-flight work and wait time statistics."""
+        waits = sorted(self._waits)
+        queued = sum(1 for job in self._inflight.values() if not job.started)
+        return {
+            "queue_depth": queued,
+            "running": sum(1 for job in self._inflight.values() if job.started),
+            "concurrency": self.concurrency,
+            "completed": self.completed,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+class _LoopThread:
+    """A background event loop hosting one scheduler, for use from synchronous code."""
+
+    def __init__(self, concurrency):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="prediction-scheduler", daemon=True)
+        self.thread.start()
+        self.scheduler = PredictionScheduler(concurrency)
+
+_background = None
+_background_lock = threading.Lock()
+_concurrency = DEFAULT_CONCURRENCY
+
+def configure(concurrency):
+    """Set the shared scheduler's concurrency; only effective before its first use."""
+    global _concurrency
+    _concurrency = concurrency
+
+def _get_background():
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = _LoopThread(_concurrency)
+        return _background
+
+def submit_prediction(kind, priority=PRIORITY_INTERACTIVE, timeout=None, **kwargs):
+    """Submit a prediction to the shared scheduler from synchronous code and wait for it.
+
+    If the wait times out or is interrupted, the request is withdrawn so an
+    abandoned session does not keep its slot in the queue.
+    """
+    background = _get_background()
+    # The loop thread has its own context; carry the caller's so spans nest under its current span
+    future = asyncio.run_coroutine_threadsafe(
+        background.scheduler.submit(kind, priority=priority, context=contextvars.copy_context(), **kwargs),
+        background.loop,
+    )
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+class _SharedStream:
+    """One scheduled generation whose tokens are broadcast to every subscriber (single flight).
+
+    Identical stream requests made while one is queued or running join it and
+    replay the tokens produced so far. When the last subscriber leaves, a
+    queued job is dropped and a running one stops generating.
+    """
+
+    _lock = threading.Lock()
+    _active = {}
+    _by_id = {}
+    _ids = itertools.count(1)
+    coalesced = 0
+    abandoned_count = 0
+
+    def __init__(self, key, kind, kwargs):
+        self.id = next(self._ids)
+        self.key = key
+        self.kind = kind
+        self.kwargs = kwargs
+        self.chunks = []
+        self.cond = threading.Condition()
+        self.subscribers = 0
+        self.abandoned = False
+        self.done = False
+        self.result = None
+        self.exception = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.future = None
+
+    @classmethod
+    def join(cls, kind, priority, kwargs):
+        """Subscribe to the in-flight stream for this request, starting one if there is none."""
+        key = request_key(kind, kwargs)
+        with cls._lock:
+            shared = cls._active.get(key)
+            created = shared is None
+            if created:
+                shared = cls(key, kind, kwargs)
+                cls._active[key] = shared
+                cls._by_id[shared.id] = shared
+            else:
+                cls.coalesced += 1
+            shared.subscribers += 1
+        if created:
+            background = _get_background()
+            shared.future = asyncio.run_coroutine_threadsafe(
+                background.scheduler.submit("stream", priority=priority, context=contextvars.copy_context(),
+                                            stream_id=shared.id),
+                background.loop,
+            )
+            shared.future.add_done_callback(shared._finish)
+        return shared
+
+    @classmethod
+    def get(cls, stream_id):
+        with cls._lock:
+            return cls._by_id[stream_id]
+
+    def leave(self):
+        with self._lock:
+            self.subscribers -= 1
+            if self.subscribers > 0 or self.done:
+                return
+            self.abandoned = True
+            type(self).abandoned_count += 1
+            self._forget()
+        if self.future is not None:
+            self.future.cancel()
+
+    def _forget(self):
+        if self._active.get(self.key) is self:
+            del self._active[self.key]
+
+    def produce(self):
+        """Run the generation in a scheduler worker, publishing each token."""
+        self.started = time.perf_counter()
+        stream = STREAMERS[self.kind](**self.kwargs)
+        tokens = iter(stream)
+        try:
+            for token in tokens:
+                if self.abandoned:
+                    break
+                with self.cond:
+                    self.chunks.append(token)
+                    self.cond.notify_all()
+        finally:
+            # Closing the generator closes the Ollama connection, so decoding stops
+            tokens.close()
+        return stream
+
+    def _finish(self, future):
+        with self._lock:
+            self._forget()
+            self._by_id.pop(self.id, None)
+        with self.cond:
+            if future.cancelled():
+                self.exception = RuntimeError("Prediction cancelled")
+            elif future.exception() is not None:
+                self.exception = future.exception()
+            else:
+                self.result = future.result()
+            self.done = True
+            self.cond.notify_all()
+
+class ScheduledStream:
+    """A streaming prediction run through the shared scheduler.
+
+    Iterate it like predict.PredictionStream; text, stats, context, error and
+    standings are filled once iteration finishes, and wait_seconds is the time
+    spent queued. Call close() (or finish iterating) to release the request.
+    """
+
+    def __init__(self, kind, priority=PRIORITY_INTERACTIVE, **kwargs):
+        self._shared = _SharedStream.join(kind, priority, kwargs)
+        self._closed = False
+        self.text = ""
+        self.stats = {}
+        self.context = ""
+        self.error = None
+
+    @property
+    def wait_seconds(self):
+        shared = self._shared
+        return (shared.started or time.perf_counter()) - shared.submitted
+
+    def __iter__(self):
+        shared = self._shared
+        position = 0
+        try:
+            while True:
+                with shared.cond:
+                    while position >= len(shared.chunks) and not shared.done:
+                        shared.cond.wait()
+                    chunks = shared.chunks[position:]
+                    finished = shared.done and position + len(chunks) >= len(shared.chunks)
+                for chunk in chunks:
+                    yield chunk
+                position += len(chunks)
+                if finished:
+                    break
+            if shared.exception is not None:
+                raise shared.exception
+            result = shared.result
+            self.text, self.stats, self.context, self.error = result.text, result.stats, result.context, result.error
+        finally:
+            self.close()
+
+    def close(self):
+        """Withdraw this subscriber; the generation stops if nobody else is waiting for it."""
+        if not self._closed:
+            self._closed = True
+            self._shared.leave()
+
+    @property
+    def standings(self):
+        return predict.parse_standings(self.text)
+
+def stream_prediction(kind, priority=PRIORITY_INTERACTIVE, **kwargs):
+    """Start (or join) a scheduled streaming prediction; kind is a STREAMERS name."""
+    return ScheduledStream(kind, priority, **kwargs)
+
+def scheduler_stats():
+    """Stats of the shared scheduler, including shared streams."""
+    background = _get_background()
+    stats = asyncio.run_coroutine_threadsafe(_async_stats(background.scheduler), background.loop).result()
+    stats["streams_coalesced"] = _SharedStream.coalesced
+    stats["streams_abandoned"] = _SharedStream.abandoned_count
+    return stats
+
+async def _async_stats(scheduler):
+    return scheduler.stats()
@@ -0,0 +1,122 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning import get_round_data, get_season_lengths
+
+# Below this many races of the current season, pad a team's sample with last season's races
+MIN_SAMPLES = 5
+
+# Simulations processed per vectorized batch, bounding memory use
+CHUNK_SIZE = 20_000
+
+def _race_point_samples(rounds, year, after_round, team_ids):
+    """Padded (teams x samples) matrix of per-race points and the sample count per team."""
+    current = rounds[(rounds['year'] == year) & (rounds['round'] <= after_round)]
+    previous = rounds[rounds['year'] == year - 1]
+    samples = []
+    for team_id in team_ids:
+        values = current.loc[current['constructorId'] == team_id, 'race_points'].to_numpy()
+        if len(values) < MIN_SAMPLES:
+            history = previous.loc[previous['constructorId'] == team_id, 'race_points'].to_numpy()
+            values = np.concatenate([values, history])
+        if len(values) == 0:
+            values = np.zeros(1)
+        samples.append(values)
+
+    counts = np.array([len(values) for values in samples])
+    matrix = np.zeros((len(samples), counts.max()), dtype=np.float32)
+    for i, values in enumerate(samples):
+        matrix[i, :len(values)] = values
+    return matrix, counts
+
+def simulate_season(year, after_round=None, n_sims=100_000, seed=None, data_dir=None):
+    """Monte Carlo simulation of the rest of a season from the standings after a round.
+
+    Each constructor's points in every remaining race are drawn from its own
+    per-race points so far this season (padded with last season's races early
+    on). Draws are independent between teams and races. All simulations and
+    races are drawn as NumPy arrays; only batches of CHUNK_SIZE simulations
+    are looped over.
+
+    Returns a DataFrame per constructor with current points, mean and
+    5/50/95th percentile final points, championship probability and the
+    probability of each final position (P1, P2, ...), best first.
+    """
+    rounds = get_round_data(data_dir)
+    season = rounds[rounds['year'] == year]
+    if season.empty:
+        raise ValueError(f"No standings for {year} in the data")
+    if after_round is None:
+        after_round = int(season['round'].max())
+    standings = season[season['round'] == after_round]
+    if standings.empty:
+        raise ValueError(f"No standings after round {after_round} of {year}")
+
+    team_ids = standings['constructorId'].to_numpy()
+    current = standings['points'].to_numpy(dtype=np.float32)
+    n_teams = len(team_ids)
+    remaining = max(int(get_season_lengths(data_dir).get(year, after_round)) - after_round, 0)
+
+    samples, counts = _race_point_samples(rounds, year, after_round, team_ids)
+    rng = np.random.default_rng(seed)
+    finals = np.empty((n_sims, n_teams), dtype=np.float32)
+    position_counts = np.zeros(n_teams * n_teams, dtype=np.int64)
+    team_index = np.arange(n_teams)
+
+    for start in range(0, n_sims, CHUNK_SIZE):
+        size = min(CHUNK_SIZE, n_sims - start)
+        # Sample index per (simulation, race, team), then gather and sum over races
+        draws = (rng.random((size, remaining, n_teams), dtype=np.float32) * counts).astype(np.int64)
+        totals = current + samples[team_index, draws].sum(axis=1)
+        finals[start:start + size] = totals
+
+        # Rank with current points as the tie-breaker; position 0 is the champion
+        order = np.lexsort((-np.broadcast_to(current, totals.shape), -totals), axis=1)
+        positions = np.empty_like(order)
+        np.put_along_axis(positions, order, np.arange(n_teams), axis=1)
+        position_counts += np.bincount((team_index * n_teams + positions).ravel(), minlength=n_teams * n_teams)
+
+    probabilities = position_counts.reshape(n_teams, n_teams) / n_sims
+    p05, p50, p95 = np.percentile(finals, [5, 50, 95], axis=0)
+    result = pd.DataFrame({
+        'name': standings['name'].to_numpy(),
+        'constructorId': team_ids,
+        'current_points': current,
+        'mean_points': finals.mean(axis=0, dtype=np.float64),
+        'p05_points': p05,
+        'p50_points': p50,
+        'p95_points': p95,
+        'champion_prob': probabilities[:, 0],
+    })
+    for position in range(n_teams):
+        result[f'P{position + 1}'] = probabilities[:, position]
+    result.attrs.update({'year': year, 'after_round': after_round, 'remaining_rounds': remaining, 'n_sims': n_sims})
+    return result.sort_values('mean_points', ascending=False).reset_index(drop=True)
+
+def format_simulation(result):
+    """Render a simulation result as text, one line per constructor."""
+    attrs = result.attrs
+    lines = [
+        f"{attrs['year']} after round {attrs['after_round']} "
+        f"({attrs['remaining_rounds']} rounds left, {attrs['n_sims']:,} simulations):"
+    ]
+    for i, row in enumerate(result.itertuples(index=False), 1):
+        lines.append(
+            f"{i}. {row.name} - {row.mean_points:.0f} points "
+            f"(90% range {row.p05_points:.0f}-{row.p95_points:.0f}), title chance {row.champion_prob:.1%}"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else 2024
+    after_round = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    start = time.perf_counter()
+    result = simulate_season(year, after_round, seed=0)
+    elapsed = time.perf_counter() - start
+    print(f"{year} after round {after_round}: {result.attrs['remaining_rounds']} rounds simulated "
+          f"{result.attrs['n_sims']:,} times in {elapsed:.2f}s\n")
+    print(result[['name', 'current_points', 'mean_points', 'p05_points', 'p95_points', 'champion_prob']]
+          .to_string(index=False, float_format=lambda v: f"{v:.2f}"))
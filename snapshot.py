@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_cleaning import DATA_FILES, _file_signature
+
+SNAPSHOT_DIR = 'snapshot'
+MANIFEST = 'manifest.json'
+
+# Only the columns clean_data needs, with their compact dtypes
+SNAPSHOT_COLUMNS = {
+    'constructor_standings.csv': {
+        'raceId': np.int32,
+        'constructorId': np.int32,
+        'points': np.float64,
+        'position': np.int32,
+        'wins': np.int32,
+    },
+    'races.csv': {
+        'raceId': np.int32,
+        'year': np.int32,
+        'round': np.int32,
+    },
+    'constructors.csv': {
+        'constructorId': np.int32,
+        'name': str,
+    },
+}
+
+def _snapshot_path(data_dir):
+    return os.path.join(data_dir, SNAPSHOT_DIR)
+
+def _column_file(table, column):
+    return f"{os.path.splitext(table)[0]}.{column}.npy"
+
+def _to_array(series, dtype):
+    """Convert a parsed CSV column to a fixed-width array that can be memory-mapped."""
+    if dtype is str:
+        return series.astype(str).to_numpy().astype('U')
+    if np.issubdtype(dtype, np.integer) and series.isna().any():
+        # Missing values (e.g. \N) cannot live in an int column; keep them as NaN
+        return pd.to_numeric(series, errors='coerce').to_numpy(np.float64)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype)
+
+def compile_snapshot(data_dir='data'):
+    """Convert the CSVs in data_dir into a binary column snapshot."""
+    out_dir = _snapshot_path(data_dir)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = {'sources': {}, 'tables': {}}
+    for table, columns in SNAPSHOT_COLUMNS.items():
+        path = os.path.join(data_dir, table)
+        signature = _file_signature(path)
+        frame = pd.read_csv(path, usecols=list(columns), na_values=['\\N'])
+        manifest['sources'][table] = list(signature)
+        manifest['tables'][table] = {'rows': len(frame), 'columns': list(columns)}
+        for column, dtype in columns.items():
+            np.save(os.path.join(out_dir, _column_file(table, column)), _to_array(frame[column], dtype))
+
+    # Write the manifest last so a half-written snapshot is never considered fresh
+    tmp = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+def _read_manifest(data_dir):
+    try:
+        with open(os.path.join(_snapshot_path(data_dir), MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def snapshot_is_fresh(data_dir='data', manifest=None):
+    """True if a snapshot exists and matches the current CSV contents."""
+    manifest = manifest or _read_manifest(data_dir)
+    if manifest is None:
+        return False
+    for table in DATA_FILES:
+        recorded = manifest['sources'].get(table)
+        if recorded is None:
+            return False
+        recorded = tuple(recorded)
+        current = _file_signature(os.path.join(data_dir, table), recorded)
+        if current[2] != recorded[2]:
+            return False
+    return True
+
+def load_snapshot(data_dir='data'):
+    """Load a fresh snapshot as DataFrames, or return None if there is none.
+
+    Numeric columns are memory-mapped and wrapped without copying.
+    """
+    manifest = _read_manifest(data_dir)
+    if not snapshot_is_fresh(data_dir, manifest):
+        return None
+
+    out_dir = _snapshot_path(data_dir)
+    frames = []
+    for table in DATA_FILES:
+        columns = {}
+        for column in manifest['tables'][table]['columns']:
+            columns[column] = np.load(os.path.join(out_dir, _column_file(table, column)), mmap_mode='r')
+        frames.append(pd.DataFrame(columns, copy=False))
+    return tuple(frames)
+
+if __name__ == "__main__":
+    for data_dir in sys.argv[1:] or ['data']:
+        manifest = compile_snapshot(data_dir)
+        rows = {table: info['rows'] for table, info in manifest['tables'].items()}
+        print(f"Compiled snapshot for {data_dir}: {rows}")
@@ -0,0 +1,164 @@
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+# A full constructors' ranking has this many lines
+RANKING_LINES = 10
+
+# "1. Red Bull - 800 points", "2) **Ferrari**: 450.5 pts", "3. McLaren (420pts)"
+_RANKING_LINE = re.compile(
+    r"^\s*[*#\-]*\s*(?P<position>\d{1,2})\s*[.)]\s*(?P<rest>.+?)\s*$"
+)
+_POINTS = re.compile(r"(?P<points>\d+(?:[.,]\d+)?)\s*(?:pts|points|pt)\b", re.IGNORECASE)
+_TRAILING_NUMBER = re.compile(r"[\s\-:–(]+(?P<points>\d+(?:\.\d+)?)\s*\)?\s*$")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)")
+
+# Generous Llama 3 token sizes of an answer's parts, to cap how long a generation can run
+TOKENS_PER_RANKING_LINE = 18
+TOKENS_PER_SENTENCE = 45
+PREAMBLE_TOKENS = 32
+
+StandingEntry = namedtuple('StandingEntry', ['position', 'team', 'points', 'constructorId', 'raw'])
+
+class ParsedStandings(namedtuple('ParsedStandings', ['entries', 'summary', 'unknown_teams'])):
+    """Typed result of parsing a model's ranking output."""
+
+    @property
+    def complete(self):
+        return len(self.entries) >= RANKING_LINES
+
+    def to_frame(self):
+        return pd.DataFrame(self.entries, columns=StandingEntry._fields).drop(columns='raw')
+
+def is_ranking_line(line):
+    return _RANKING_LINE.match(line) is not None
+
+def count_complete_ranking_lines(text):
+    """Ranking lines in text that are already terminated by a newline."""
+    return sum(1 for line in text.split("\n")[:-1] if is_ranking_line(line))
+
+def extract_ranking(text, n=RANKING_LINES):
+    """Keep only the first n ranking lines of generated text."""
+    result_lines = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if is_ranking_line(line):
+            result_lines.append(line)
+        if len(result_lines) == n:
+            break
+    return "\n".join(result_lines)
+
+def _normalize(name):
+    name = re.sub(r"[^a-z0-9 ]", " ", str(name).lower())
+    name = re.sub(r"\b(f1 team|racing|team|scuderia|formula one|f1)\b", " ", name)
+    return " ".join(name.split())
+
+class TeamMatcher:
+    """Validates and canonicalizes team names against constructors.csv."""
+
+    def __init__(self, constructors):
+        self._exact = {}
+        self._names = []
+        # Later constructorIds win ties, so current teams beat historic namesakes
+        for constructor_id, name in sorted(zip(constructors['constructorId'], constructors['name'])):
+            key = _normalize(name)
+            if key:
+                self._exact[key] = (name, constructor_id)
+                self._names.append((key, name, constructor_id))
+
+    def match(self, raw_name):
+        """Return (canonical name, constructorId), or (None, None) if unknown."""
+        key = _normalize(raw_name)
+        if not key:
+            return None, None
+        if key in self._exact:
+            return self._exact[key]
+        # Otherwise the longest known name contained in the raw name (or vice versa)
+        best = None
+        for known, name, constructor_id in self._names:
+            if re.search(rf"\b{re.escape(known)}\b", key) or re.search(rf"\b{re.escape(key)}\b", known):
+                if best is None or (len(known), constructor_id) > (len(best[0]), best[2]):
+                    best = (known, name, constructor_id)
+        return (best[1], best[2]) if best else (None, None)
+
+_matchers = {}
+
+def get_team_matcher(data_dir=None):
+    """TeamMatcher for the constructors in data_dir, rebuilt when the data reloads."""
+    from data_cleaning import get_constructors
+
+    constructors = get_constructors(data_dir)
+    cached = _matchers.get(data_dir)
+    if cached is None or cached[0] is not constructors:
+        cached = (constructors, TeamMatcher(constructors))
+        _matchers[data_dir] = cached
+    return cached[1]
+
+def _split_team_points(rest):
+    rest = rest.replace("**", "").replace("__", "")
+    match = _POINTS.search(rest) or _TRAILING_NUMBER.search(rest)
+    if match is None:
+        return rest.strip(" -:–"), None
+    points = float(match.group("points").replace(",", "."))
+    team = rest[:match.start()].strip(" -:–(")
+    return team, points
+
+def parse_standings(text, matcher=None, n=RANKING_LINES):
+    """Parse a ranked standings answer into typed entries plus the trailing summary.
+
+    Team names are validated against constructors.csv; lines naming an unknown
+    team are reported in unknown_teams and left out of entries. Only the first
+    occurrence of each position and team is kept.
+    """
+    matcher = matcher or get_team_matcher()
+    entries, unknown, summary_lines = [], [], []
+    seen_positions, seen_teams = set(), set()
+    last_ranking_line = -1
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        match = _RANKING_LINE.match(line)
+        if match is None or len(entries) >= n:
+            continue
+        last_ranking_line = i
+        position = int(match.group("position"))
+        team, points = _split_team_points(match.group("rest"))
+        name, constructor_id = matcher.match(team)
+        if name is None:
+            unknown.append(team)
+            continue
+        if position in seen_positions or constructor_id in seen_teams:
+            continue
+        seen_positions.add(position)
+        seen_teams.add(constructor_id)
+        entries.append(StandingEntry(position, name, points, constructor_id, line.strip()))
+
+    summary_lines = [line for line in lines[last_ranking_line + 1:] if line.strip()]
+    return ParsedStandings(entries, " ".join(line.strip() for line in summary_lines), unknown)
+
+def answer_token_limit(n_lines=RANKING_LINES, summary_sentences=0):
+    """Tokens a complete answer (a short preamble, the ranking and the summary) fits in."""
+    return PREAMBLE_TOKENS + n_lines * TOKENS_PER_RANKING_LINE + summary_sentences * TOKENS_PER_SENTENCE
+
+class RankingStopper:
+    """Watches streamed text and reports when the ranking (plus an optional summary) is done."""
+
+    def __init__(self, n_lines=RANKING_LINES, summary_sentences=0):
+        self.n_lines = n_lines
+        self.summary_sentences = summary_sentences
+        self.text = ""
+
+    def feed(self, chunk):
+        """Add a chunk of generated text; returns True once generation can stop."""
+        self.text += chunk
+        return self.done()
+
+    def done(self):
+        lines = self.text.split("\n")
+        ranking = [i for i, line in enumerate(lines[:-1]) if is_ranking_line(line)]
+        if len(ranking) < self.n_lines:
+            return False
+        if self.summary_sentences == 0:
+            return True
+        after = "\n".join(lines[ranking[self.n_lines - 1] + 1:])
+        return len(_SENTENCE_END.findall(after)) >= self.summary_sentences
@@ -0,0 +1,163 @@
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Modules that pull in the ML stacks; legacy mode must never import these
+HEAVY_MODULES = ("torch", "transformers", "sentence_transformers", "chromadb", "onnxruntime", "gradio")
+
+# Comma-separated preload targets to start in the background at process start, e.g. "data,vector_store"
+PRELOAD_ENV = "F1_PRELOAD"
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+_import_timings = {}
+_preloads = {}
+_lock = threading.Lock()
+
+@contextmanager
+def timed_import(label):
+    """Record how long the imports in the with block took (first time per process only)."""
+    start = time.perf_counter()
+    yield
+    with _lock:
+        _import_timings.setdefault(label, time.perf_counter() - start)
+
+def import_timings():
+    """Seconds spent importing each timed_import block, in import order."""
+    with _lock:
+        return dict(_import_timings)
+
+def heavy_modules_loaded():
+    """The heavy ML modules that have been imported in this process."""
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+class Preload:
+    """A background loading task with an explicit state: pending, loading, ready or failed."""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.state = "pending"
+        self.seconds = None
+        self.error = None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.state = "loading"
+        self.thread = threading.Thread(target=self._run, name=f"preload-{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            self.target()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+        else:
+            self.state = "ready"
+            self.ready.set()
+        finally:
+            self.seconds = time.perf_counter() - start
+            self.done.set()
+
+    def wait(self, timeout=None):
+        """Block until the preload finished; True if it succeeded."""
+        self.done.wait(timeout)
+        return self.ready.is_set()
+
+    def status(self):
+        return {"state": self.state, "seconds": self.seconds, "error": self.error}
+
+def _load_data():
+    from data_cleaning import get_cleaned_data, get_round_data
+
+    get_cleaned_data()
+    get_round_data()
+
+def _load_vector_store():
+    from vector_store import health, warm_up
+
+    if not warm_up():
+        raise RuntimeError(health()["error"])
+
+def _load_ollama_model(model="llama3:8b"):
+    from ollama_client import get_client
+
+    get_client().load_model(model)
+
+# Named preload targets; each imports what it needs inside the background thread
+TARGETS = {
+    "data": _load_data,
+    "vector_store": _load_vector_store,
+    "ollama": _load_ollama_model,
+}
+
+def preload(name, target=None):
+    """Start loading name in the background (once per process) and return its Preload."""
+    with _lock:
+        if name not in _preloads:
+            _preloads[name] = Preload(name, target or TARGETS[name]).start()
+        return _preloads[name]
+
+def preload_from_env(default=""):
+    """Start every preload named in the F1_PRELOAD environment variable."""
+    names = [name.strip() for name in os.environ.get(PRELOAD_ENV, default).split(",") if name.strip()]
+    return [preload(name) for name in names if name in TARGETS]
+
+def readiness():
+    """State of every preload started in this process, plus the import timings."""
+    with _lock:
+        preloads = {name: task.status() for name, task in _preloads.items()}
+    return {
+        "ready": all(status["state"] == "ready" for status in preloads.values()),
+        "preloads": preloads,
+        "imports": import_timings(),
+        "heavy_modules": heavy_modules_loaded(),
+    }
+
+def profile_imports(module, top=15):
+    """Import module in a fresh interpreter under -X importtime.
+
+    Returns (total seconds, [(cumulative seconds, module name), ...], heavy)
+    with the slowest direct imports first and heavy listing the HEAVY_MODULES
+    the import pulled in.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    # Children are printed before their parent, one indent level deeper
+    children, total, heavy = [], 0.0, []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match is None:
+            continue
+        seconds, depth, name = int(match.group(2)) / 1e6, len(match.group(3)), match.group(4)
+        if name in HEAVY_MODULES:
+            heavy.append(name)
+        if depth == 3:
+            children.append((seconds, name))
+        elif depth == 1:
+            if name == module:
+                total = seconds
+                break
+            children = []
+    return total, sorted(children, reverse=True)[:top], heavy
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or ["predict", "vector_store", "simulator", "baseline"]
+    for module in modules:
+        total, children, heavy = profile_imports(module)
+        print(f"import {module}: {total * 1000:.0f} ms (heavy ML modules: {', '.join(heavy) or 'none'})")
+        for seconds, name in children:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
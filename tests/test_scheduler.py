@@ -0,0 +1,40 @@
+import ollama_client
+from scheduler import stream_prediction, submit_prediction
+from tracing import get_trace, span
+
+ANSWER = [f"{i}. Team {i} - {100 - i} points\n" for i in range(1, 11)] + ["One. Two."]
+
+class FakeClient:
+    """Stands in for Ollama: streams a fixed ranking, then the final stats chunk."""
+
+    def generate_stream(self, model, prompt, options=None, **extra):
+        for token in ANSWER:
+            yield {"response": token}
+        yield {"done": True, "done_reason": "stop", "eval_count": len(ANSWER), "eval_duration": 10 ** 6}
+
+def _stage_names(trace_id):
+    return [s.name for s in get_trace(trace_id)]
+
+def test_scheduled_stream_spans_nest_under_caller():
+    previous = ollama_client.set_client(FakeClient())
+    try:
+        with span("prediction") as parent:
+            stream = stream_prediction("rag", query="", target_year=2020, temperature=0.1, use_cache=False)
+            assert "".join(stream) == "".join(ANSWER)
+        names = _stage_names(parent.trace_id)
+    finally:
+        ollama_client.set_client(previous)
+    assert "retrieval" in names
+    assert "llm.generate" in names
+
+def test_submitted_prediction_spans_nest_under_caller():
+    previous = ollama_client.set_client(FakeClient())
+    try:
+        with span("prediction") as parent:
+            submit_prediction("legacy", start_year=2018, end_year=2019, target_year=2020, temperature=0.2,
+                              use_cache=False)
+        names = _stage_names(parent.trace_id)
+    finally:
+        ollama_client.set_client(previous)
+    assert "prompt_assembly" in names
+    assert "llm.generate" in names
@@ -0,0 +1,246 @@
+import contextvars
+import functools
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Set F1_TRACING=0 to turn spans into no-ops
+ENABLED = os.environ.get("F1_TRACING", "1") != "0"
+
+# Finished spans kept in memory for the JSON export and timing panels
+MAX_SPANS = 10_000
+
+# Histogram bucket bounds (seconds) for the OpenMetrics export
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# Ollama reports these durations in nanoseconds in its final chunk
+OLLAMA_STAGES = (
+    ("ollama.load", "load_duration", None),
+    ("ollama.prompt_eval", "prompt_eval_duration", "prompt_eval_count"),
+    ("ollama.eval", "eval_duration", "eval_count"),
+)
+
+class Span:
+    """One timed stage. start is wall-clock epoch seconds, duration is in seconds."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attrs", "_t0")
+
+    def __init__(self, name, trace_id, span_id, parent_id, attrs):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = None
+        self.attrs = attrs
+        self._t0 = time.perf_counter()
+
+    def to_dict(self):
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start": self.start, "duration": self.duration, "attrs": self.attrs,
+        }
+
+class Tracer:
+    """Keeps recent finished spans plus per-stage duration histograms and token counters."""
+
+    def __init__(self, max_spans=MAX_SPANS):
+        self.spans = deque(maxlen=max_spans)
+        self.histograms = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+            histogram = self.histograms.setdefault(span.name, [0, 0.0, [0] * len(BUCKETS)])
+            histogram[0] += 1
+            histogram[1] += span.duration
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    histogram[2][i] += 1
+            if span.name == "ollama.prompt_eval":
+                self.tokens["prompt"] += span.attrs.get("tokens", 0)
+            elif span.name == "ollama.eval":
+                self.tokens["completion"] += span.attrs.get("tokens", 0)
+
+    def get_trace(self, trace_id):
+        """Spans of one trace, in start order."""
+        with self.lock:
+            spans = [span for span in self.spans if span.trace_id == trace_id]
+        return sorted(spans, key=lambda span: (span.start, span.span_id))
+
+    def export_json(self, trace_id=None, limit=1000):
+        with self.lock:
+            spans = list(self.spans)
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return json.dumps([span.to_dict() for span in spans[-limit:]])
+
+    def export_openmetrics(self):
+        """Per-stage duration histograms and Ollama token counters in OpenMetrics text format."""
+        with self.lock:
+            histograms = {name: (count, total, list(buckets)) for name, (count, total, buckets) in self.histograms.items()}
+            tokens = dict(self.tokens)
+        lines = [
+            "# TYPE f1_stage_duration_seconds histogram",
+            "# UNIT f1_stage_duration_seconds seconds",
+            "# HELP f1_stage_duration_seconds Duration of each traced stage.",
+        ]
+        for name, (count, total, buckets) in sorted(histograms.items()):
+            for bound, bucket in zip(BUCKETS, buckets):
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f'f1_stage_duration_seconds_bucket{{stage="{name}",le="{le}"}} {bucket}')
+            lines.append(f'f1_stage_duration_seconds_count{{stage="{name}"}} {count}')
+            lines.append(f'f1_stage_duration_seconds_sum{{stage="{name}"}} {total}')
+        lines += [
+            "# TYPE f1_llm_tokens counter",
+            "# HELP f1_llm_tokens Tokens processed by Ollama.",
+        ]
+        lines += [f'f1_llm_tokens_total{{kind="{kind}"}} {count}' for kind, count in tokens.items()]
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+            self.histograms.clear()
+            self.tokens = {"prompt": 0, "completion": 0}
+
+_tracer = Tracer()
+_current = contextvars.ContextVar("f1_current_span", default=None)
+_ids = itertools.count(1)
+
+def get_tracer():
+    return _tracer
+
+def current_span():
+    return _current.get()
+
+def start_span(name, parent=None, **attrs):
+    """Start a span without making it current; finish it with finish_span."""
+    parent = parent or _current.get()
+    span_id = next(_ids)
+    trace_id = parent.trace_id if parent is not None else span_id
+    return Span(name, trace_id, span_id, parent.span_id if parent is not None else None, attrs)
+
+def finish_span(span, duration=None):
+    span.duration = time.perf_counter() - span._t0 if duration is None else duration
+    if ENABLED:
+        _tracer.record(span)
+    return span
+
+@contextmanager
+def span(name, **attrs):
+    """Time the with block as a span, nested under the current span; yields the Span for attrs."""
+    current = start_span(name, **attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        finish_span(current)
+
+def traced(name):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record_span(name, duration, parent=None, start=None, **attrs):
+    """Record an already measured stage (e.g. a server-side duration) as a finished span."""
+    recorded = start_span(name, parent, **attrs)
+    if start is not None:
+        recorded.start = start
+    return finish_span(recorded, duration)
+
+def record_ollama_stats(stats, parent, start=None):
+    """Add Ollama's load, prompt-eval and decode timings and token counts as child spans.
+
+    When generation was stopped early Ollama sends no final stats, so the
+    client-measured time to first token and the decode time after it are
+    recorded instead.
+    """
+    stages = [(name, stats[key], stats.get(count_key)) for name, key, count_key in OLLAMA_STAGES if key in stats]
+    if stages:
+        offset = start
+        for name, nanoseconds, tokens in stages:
+            attrs = {"tokens": tokens} if tokens is not None else {}
+            record_span(name, nanoseconds / 1e9, parent, offset, **attrs)
+            if offset is not None:
+                offset += nanoseconds / 1e9
+    elif "time_to_first_token" in stats:
+        record_span("llm.time_to_first_token", stats["time_to_first_token"], parent, start)
+        if "elapsed" in stats:
+            record_span("llm.decode", stats["elapsed"] - stats["time_to_first_token"], parent,
+                        None if start is None else start + stats["time_to_first_token"],
+                        tokens=stats.get("token_count"))
+
+def get_trace(trace_id):
+    return _tracer.get_trace(trace_id)
+
+def breakdown(spans):
+    """Rows of (stage indented by depth, milliseconds, share of the root span, attrs) for display."""
+    if not spans:
+        return []
+    depth = {}
+    ids = {span.span_id for span in spans}
+    root = next((span for span in spans if span.parent_id not in ids), spans[0])
+    rows = []
+    for span in spans:
+        depth[span.span_id] = depth.get(span.parent_id, -1) + 1 if span.parent_id in ids else 0
+        rows.append({
+            "stage": "  " * depth[span.span_id] + span.name,
+            "ms": round(span.duration * 1000, 2),
+            "share": span.duration / root.duration if root.duration else 0.0,
+            "attrs": ", ".join(f"{k}={v}" for k, v in span.attrs.items()),
+        })
+    return rows
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            body, content_type = _tracer.export_openmetrics(), "application/openmetrics-text; version=1.0.0; charset=utf-8"
+        elif url.path == "/spans":
+            trace = parse_qs(url.query).get("trace")
+            body, content_type = _tracer.export_json(int(trace[0]) if trace else None), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve /metrics (OpenMetrics) and /spans (JSON) locally, once per process."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            port = int(port or os.environ.get("F1_METRICS_PORT", 9464))
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -1,75 +1,101 @@
-import chromadb
-from chromadb.utils import embedding_functions
-import pandas as pd
-from data_cleaning import load_data, clean_data
+from data_cleaning import get_cleaned_data
+from documents import create_f1_documents, get_document_index
+from tracing import span
+import hashlib
+import json
 import os
+import sys
+import threading
+import time
 
 # Use sentence-transformers for embeddings
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
+COLLECTION_NAME = "f1_data"
+COLLECTION_METADATA = {"description": "F1 Constructor Championship Data"}
+
+# Max documents sent to Chroma per add/upsert call
+BATCH_SIZE = 500
+
+# Where the persistent Chroma database lives; override with F1_VECTOR_DB
+VECTOR_DB_DIR = os.environ.get("F1_VECTOR_DB", os.path.join(os.path.dirname(__file__), "vector_db"))
+
+# Embedding cache database; None uses embedding_cache.DEFAULT_CACHE_PATH
+EMBEDDING_CACHE_PATH = None
+
+class _Resources:
+    """Process-wide Chroma client, embedding function and collection, opened once."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.client = None
+        self.embedding_fn = None
+        self.collection = None
+        self.ready = threading.Event()
+        self.warm_up_thread = None
+        self.warm_up_seconds = None
+        self.error = None
+
+_resources = _Resources()
+
+# Seasons whose documents changed (e.g. by a dataset switch) but are not re-embedded yet
+_pending = {"years": set(), "data_dir": None}
+_pending_lock = threading.Lock()
+
 def get_chroma_client():
     """Get or create ChromaDB client with persistent storage."""
-    persist_dir = os.path.join(os.path.dirname(__file__), "vector_db")
-    client = chromadb.PersistentClient(path=persist_dir)
-    return client
+    # chromadb is imported on first use so structured lookups never load it
+    import chromadb
+
+    with _resources.lock:
+        if _resources.client is None:
+            _resources.client = chromadb.PersistentClient(path=VECTOR_DB_DIR)
+        return _resources.client
 
 def get_embedding_function():
-    """Get the embedding function for ChromaDB."""
-    return embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name=EMBEDDING_MODEL
-    )
+    """Get the embedding function for ChromaDB, backed by the on-disk embedding cache."""
+    from chromadb.utils import embedding_functions
+    from embedding_cache import CachedEmbeddingFunction, EmbeddingCache
+
+    with _resources.lock:
+        if _resources.embedding_fn is None:
+            _resources.embedding_fn = CachedEmbeddingFunction(
+                model_name=EMBEDDING_MODEL,
+                factory=lambda: embedding_functions.SentenceTransformerEmbeddingFunction(
+                    model_name=EMBEDDING_MODEL
+                ),
+                inner_name=embedding_functions.SentenceTransformerEmbeddingFunction.name(),
+                cache=EmbeddingCache(EMBEDDING_CACHE_PATH) if EMBEDDING_CACHE_PATH else None,
+            )
+        return _resources.embedding_fn
+
+def _set_collection(collection):
+    """Replace the cached collection handle (after a rebuild or sync)."""
+    with _resources.lock:
+        _resources.collection = collection
+    return collection
+
+def reset_resources():
+    """Drop all cached resources; the next call reopens them."""
+    global _resources
+    with _resources.lock:
+        _resources = _Resources()
+
+def content_hash(document, metadata):
+    """Stable hash of a document and its metadata, used to detect changed entries."""
+    payload = json.dumps([document, metadata], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-def create_f1_documents():
-    """Create documents from F1 data for vector storage."""
-    constructor_standings, races, constructors = load_data()
-    seasonal = clean_data(constructor_standings, races, constructors)
-    
-    documents = []
-    metadatas = []
-    ids = []
-    
-    # Create documents for each season-constructor combination
-    for _, row in seasonal.iterrows():
-        year = int(row['year'])
-        constructor = row['name']
-        points = row['points']
-        position = int(row['position'])
-        wins = int(row['wins'])
-        
-        # Create a rich document
-        doc = f"In the {year} F1 season, {constructor} finished in position {position} with {points} points and {wins} race wins."
-        
-        documents.append(doc)
-        metadatas.append({
-            "year": year,
-            "constructor": constructor,
-            "points": float(points),
-            "position": position,
-            "wins": wins
-        })
-        ids.append(f"{year}_{constructor.replace(' ', '_')}")
-    
-    # Create season summary documents
-    for year in seasonal['year'].unique():
-        year_data = seasonal[seasonal['year'] == year].sort_values('points', ascending=False)
-        
-        champion = year_data.iloc[0]
-        top_3 = year_data.head(3)
-        
-        summary = f"Season {int(year)} Summary: {champion['name']} won the championship with {champion['points']} points and {int(champion['wins'])} wins. "
-        summary += f"Top 3: 1. {top_3.iloc[0]['name']}, 2. {top_3.iloc[1]['name']}, 3. {top_3.iloc[2]['name']}."
-        
-        documents.append(summary)
-        metadatas.append({
-            "year": int(year),
-            "constructor": "SUMMARY",
-            "points": 0.0,
-            "position": 0,
-            "wins": 0
-        })
-        ids.append(f"{int(year)}_SUMMARY")
-    
-    return documents, metadatas, ids
+def _with_content_hashes(documents, metadatas):
+    """Copy metadatas, adding a content_hash field to each."""
+    return [
+        {**metadata, "content_hash": content_hash(document, metadata)}
+        for document, metadata in zip(documents, metadatas)
+    ]
+
+def _batched(*columns):
+    for start in range(0, len(columns[0]), BATCH_SIZE):
+        yield tuple(column[start:start + BATCH_SIZE] for column in columns)
 
 def build_vector_store(force_rebuild=False):
     """Build or rebuild the vector store."""
@@ -79,67 +105,241 @@ def build_vector_store(force_rebuild=False):
     # Check if collection exists
     existing_collections = [c.name for c in client.list_collections()]
     
-    if "f1_data" in existing_collections and not force_rebuild:
+    if COLLECTION_NAME in existing_collections and not force_rebuild:
         print("Vector store already exists. Use force_rebuild=True to rebuild.")
-        return client.get_collection("f1_data", embedding_function=embedding_fn)
+        return _set_collection(client.get_collection(COLLECTION_NAME, embedding_function=embedding_fn))
     
     # Delete existing collection if rebuilding
-    if "f1_data" in existing_collections:
-        client.delete_collection("f1_data")
+    if COLLECTION_NAME in existing_collections:
+        _set_collection(None)
+        client.delete_collection(COLLECTION_NAME)
     
     # Create new collection
     collection = client.create_collection(
-        name="f1_data",
+        name=COLLECTION_NAME,
         embedding_function=embedding_fn,
-        metadata={"description": "F1 Constructor Championship Data"}
+        metadata=COLLECTION_METADATA
     )
     
     # Add documents
     documents, metadatas, ids = create_f1_documents()
+    metadatas = _with_content_hashes(documents, metadatas)
     
-    collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
+    for batch_docs, batch_metas, batch_ids in _batched(documents, metadatas, ids):
+        collection.add(
+            documents=batch_docs,
+            metadatas=batch_metas,
+            ids=batch_ids
+        )
     
     print(f"Built vector store with {len(documents)} documents.")
-    return collection
+    return _set_collection(collection)
 
-def get_collection():
-    """Get the F1 data collection."""
+def sync_vector_store(years=None, data_dir=None):
+    """Incrementally sync the vector store with the current data.
+    
+    Only documents whose content hash differs from the stored one (or that are
+    new) are re-embedded and upserted; ids no longer produced are deleted.
+    With years (e.g. the seasons a dataset diff touched) only those seasons'
+    documents are generated and compared.
+    """
     client = get_chroma_client()
     embedding_fn = get_embedding_function()
-    return client.get_collection("f1_data", embedding_function=embedding_fn)
+    collection = client.get_or_create_collection(
+        name=COLLECTION_NAME,
+        embedding_function=embedding_fn,
+        metadata=COLLECTION_METADATA
+    )
+    
+    # An empty collection has nothing to keep, so a partial sync would leave it incomplete
+    if years is not None and collection.count() == 0:
+        years = None
+    seasonal = get_cleaned_data(data_dir)
+    if years is not None:
+        years = [int(year) for year in years]
+        seasonal = seasonal[seasonal['year'].isin(years)]
+    documents, metadatas, ids = create_f1_documents(seasonal)
+    metadatas = _with_content_hashes(documents, metadatas)
+    
+    # Stored hashes only; fetching embeddings or documents is not needed to diff
+    if years is None:
+        existing = collection.get(include=["metadatas"])
+    elif years:
+        existing = collection.get(where={"year": {"$in": years}}, include=["metadatas"])
+    else:
+        existing = {"ids": [], "metadatas": []}
+    stored = {
+        doc_id: (metadata or {}).get("content_hash")
+        for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+    
+    changed = [i for i, doc_id in enumerate(ids) if stored.get(doc_id) != metadatas[i]["content_hash"]]
+    stale = sorted(set(stored) - set(ids))
+    
+    changed_docs = [documents[i] for i in changed]
+    changed_metas = [metadatas[i] for i in changed]
+    changed_ids = [ids[i] for i in changed]
+    for batch_docs, batch_metas, batch_ids in _batched(changed_docs, changed_metas, changed_ids):
+        collection.upsert(
+            documents=batch_docs,
+            metadatas=batch_metas,
+            ids=batch_ids
+        )
+    for (batch_ids,) in _batched(stale):
+        collection.delete(ids=batch_ids)
+    
+    print(f"Synced vector store: {len(changed)} upserted, {len(stale)} deleted, "
+          f"{len(ids) - len(changed)} unchanged.")
+    return _set_collection(collection)
+
+def get_collection():
+    """Get the F1 data collection."""
+    with span("get_collection") as current, _resources.lock:
+        current.attrs["opened"] = _resources.collection is None
+        if _resources.collection is None:
+            client = get_chroma_client()
+            embedding_fn = get_embedding_function()
+            _resources.collection = client.get_collection(COLLECTION_NAME, embedding_function=embedding_fn)
+        return _resources.collection
+
+def warm_up():
+    """Open the client and collection and load the embedding model.
+    
+    Safe to call repeatedly; marks the resources as ready on success.
+    """
+    resources = _resources
+    if resources.ready.is_set():
+        return True
+    start = time.perf_counter()
+    try:
+        get_collection()
+        # Run the model once, bypassing the cache, so the first real query pays no load cost
+        get_embedding_function().inner(["warm up"])
+    except Exception as e:
+        resources.error = f"{type(e).__name__}: {e}"
+        return False
+    resources.error = None
+    resources.warm_up_seconds = time.perf_counter() - start
+    resources.ready.set()
+    return True
+
+def start_warm_up():
+    """Run warm_up in a background thread (once per process)."""
+    with _resources.lock:
+        if _resources.warm_up_thread is None and not _resources.ready.is_set():
+            _resources.warm_up_thread = threading.Thread(target=warm_up, name="vector-store-warm-up", daemon=True)
+            _resources.warm_up_thread.start()
+        return _resources.warm_up_thread
+
+def is_ready():
+    """True once warm_up has completed successfully."""
+    return _resources.ready.is_set()
+
+def health():
+    """Report the state of the vector store resources."""
+    resources = _resources
+    status = {
+        "ready": resources.ready.is_set(),
+        "client_open": resources.client is not None,
+        "collection_open": resources.collection is not None,
+        "model_loaded": resources.embedding_fn is not None and resources.embedding_fn.loaded,
+        "warm_up_seconds": resources.warm_up_seconds,
+        "error": resources.error,
+    }
+    if resources.collection is not None:
+        try:
+            status["documents"] = resources.collection.count()
+        except Exception as e:
+            status["error"] = f"{type(e).__name__}: {e}"
+    return status
+
+def mark_stale(years, data_dir=None):
+    """Record seasons whose documents changed; the next Chroma retrieval re-embeds them first."""
+    with _pending_lock:
+        _pending["years"].update(int(year) for year in years)
+        _pending["data_dir"] = data_dir
+
+def sync_pending():
+    """Sync the seasons recorded by mark_stale, if any; returns them.
+
+    Retrievals wait for a sync in progress, so none reads stale standings.
+    """
+    with _pending_lock:
+        years = sorted(_pending["years"])
+        if years:
+            with span("vector_store.sync_pending", seasons=len(years)):
+                sync_vector_store(years=years, data_dir=_pending["data_dir"])
+            _pending["years"].clear()
+        return years
 
 def query_similar(query_text, n_results=10, year_filter=None):
     """Query the vector store for similar documents."""
+    sync_pending()
     collection = get_collection()
     
     where_filter = None
     if year_filter:
         where_filter = {"year": {"$gte": year_filter}}
     
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=n_results,
-        where=where_filter
-    )
+    with span("collection.query", n_results=n_results):
+        results = collection.query(
+            query_texts=[query_text],
+            n_results=n_results,
+            where=where_filter
+        )
     
     return results
 
-def get_context_for_prediction(target_year, n_recent_years=4):
-    """Get relevant context from vector store for prediction."""
+def get_context_for_prediction(target_year, n_recent_years=4, mode="structured"):
+    """Get relevant context from vector store for prediction.
+    
+    mode="structured" (default) is an exact lookup of every document for the
+    n_recent_years seasons before target_year in the in-memory document index,
+    with no embedding or ANN step. mode="metadata" does the same lookup through
+    Chroma's where filter, and mode="semantic" keeps the original
+    nearest-neighbour query.
+    """
+    with span("retrieval", mode=mode):
+        return _get_context(target_year, n_recent_years, mode)
+
+def _get_context(target_year, n_recent_years, mode):
+    min_year = target_year - n_recent_years
+    
+    if mode == "structured":
+        return "\n".join(get_document_index().get_documents(min_year=min_year, max_year=target_year - 1))
+    
+    sync_pending()
     collection = get_collection()
     
+    if mode == "metadata":
+        with span("collection.get"):
+            results = collection.get(
+                where={"$and": [{"year": {"$gte": min_year}}, {"year": {"$lt": target_year}}]},
+                include=["documents", "metadatas"]
+            )
+        # Chroma returns storage order; sort into season / standings order
+        order = sorted(
+            range(len(results["ids"])),
+            key=lambda i: (
+                results["metadatas"][i]["year"],
+                results["metadatas"][i]["constructor"] != "SUMMARY",
+                results["metadatas"][i]["position"],
+            ),
+        )
+        return "\n".join(results["documents"][i] for i in order)
+    
+    if mode != "semantic":
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    
     # Query for recent performance data
     query = f"F1 constructor championship standings performance points wins {target_year - 1}"
     
-    results = collection.query(
-        query_texts=[query],
-        n_results=50,
-        where={"year": {"$gte": target_year - n_recent_years}}
-    )
+    with span("collection.query", n_results=50):
+        results = collection.query(
+            query_texts=[query],
+            n_results=50,
+            where={"year": {"$gte": min_year}}
+        )
     
     # Organize results by year
     context_parts = []
@@ -154,8 +354,12 @@ def get_context_for_prediction(target_year, n_recent_years=4):
     return "\n".join(context_parts)
 
 if __name__ == "__main__":
-    print("Building vector store...")
-    collection = build_vector_store(force_rebuild=True)
+    if "--sync" in sys.argv[1:]:
+        print("Syncing vector store...")
+        collection = sync_vector_store()
+    else:
+        print("Building vector store...")
+        collection = build_vector_store(force_rebuild=True)
     
     print("\nTesting query...")
     results = query_similar("Red Bull championship wins", n_results=5)